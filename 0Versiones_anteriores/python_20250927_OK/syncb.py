@@ -31,18 +31,28 @@ import argparse
 import logging
 import subprocess
 import shutil
+import stat
 import tempfile
 import atexit
 import time
 import datetime
-import json
 import signal
+import errno
+import threading
 import platform
+import getpass
 import psutil
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple, Optional, Set, Any
 from logging.handlers import RotatingFileHandler
 
+try:
+    import fcntl
+except ImportError:
+    # Sin fcntl (Windows) el lock se basa en la creación exclusiva del archivo
+    fcntl = None
+
 
 try:
     import tomllib
@@ -55,6 +65,9 @@ except ImportError:
         print("Instalar con: pip install tomli")
         sys.exit(1)
 
+# Sistema operativo, constante durante toda la ejecución
+SISTEMA = platform.system()
+
 
 class Config:
     """Carga y gestiona la configuración desde un archivo TOML"""
@@ -214,6 +227,7 @@ class SyncBidireccional:
         self.delete = False
         self.yes = False
         self.overwrite = False
+        self.whole_file = False
         self.backup_dir_mode = "comun"  # 'comun' o 'readonly'
         self.verbose = False
         self.use_checksum = False
@@ -221,9 +235,19 @@ class SyncBidireccional:
         self.timeout_minutes = self.config.DEFAULT_TIMEOUT_MINUTES
         self.items_especificos = []
         self.exclusiones_cli = []
+        self._archivo_exclusiones = None
+        self._pcloud_dir = None
+        # Rutas base como cadenas, para construir los argumentos de rsync sin Path
+        self._local_str = None
+        self._local_prefijo = None
+        self._pcloud_str = None
+        self._rsync_opts = None
+        self._lista_sincronizacion = None
         self.sync_crypto = False  # NUEVO: Control de sincronización Crypto
+        self.jobs = 1  # rsync simultáneos (1 = un único rsync por lotes)
         
-        # Variables para estadísticas
+        # Variables para estadísticas (protegidas por _stats_lock con --jobs > 1)
+        self._stats_lock = threading.Lock()
         self.elementos_procesados = 0
         self.errores_sincronizacion = 0
         self.archivos_transferidos = 0
@@ -237,8 +261,9 @@ class SyncBidireccional:
         # Tiempo de inicio
         self.start_time = time.time()
         
-        # Obtener hostname
+        # Obtener hostname y usuario (una sola vez; os.getlogin falla sin terminal)
         self.hostname = platform.node()
+        self._usuario = getpass.getuser()
         
         # Determinar el directorio del script
         self.script_dir = Path(__file__).parent.absolute()
@@ -258,6 +283,7 @@ class SyncBidireccional:
         
         # Lock file
         self.LOCK_FILE = Path(tempfile.gettempdir()) / "syncb.lock"        
+        self._lock_fd = None
 
     def crear_temp_file(self, suffix='', prefix='syncb_', mode='w+b'):
         """
@@ -279,7 +305,7 @@ class SyncBidireccional:
                 delete=False  # No eliminar automáticamente al cerrar
             )
             self.temp_files.append(temp_file.name)
-            self.log_debug(f"Archivo temporal creado: {temp_file.name}")
+            self.log_debug("Archivo temporal creado: %s", temp_file.name)
             return temp_file
         except Exception as e:
             self.log_error(f"Error creando archivo temporal: {e}")
@@ -318,7 +344,7 @@ class SyncBidireccional:
                 if os.path.exists(temp_file):
                     os.unlink(temp_file)
                     deleted_files += 1
-                    self.log_debug(f"Archivo temporal eliminado: {temp_file}")
+                    self.log_debug("Archivo temporal eliminado: %s", temp_file)
                 self.temp_files.remove(temp_file)
             except Exception as e:
                 self.log_error(f"Error eliminando archivo temporal {temp_file}: {e}")
@@ -413,21 +439,23 @@ class SyncBidireccional:
             def __init__(self, config):
                 self.config = config
                 super().__init__()
+                # Prefijos construidos una sola vez; sin códigos ANSI si stderr
+                # no es una terminal (redirección a archivo o tubería)
+                color = sys.stderr.isatty()
+                niveles = {
+                    logging.DEBUG: (config.MAGENTA, config.CLOCK_ICON, "DEBUG"),
+                    logging.INFO: (config.BLUE, config.INFO_ICON, "INFO"),
+                    logging.WARNING: (config.YELLOW, config.WARNING_ICON, "WARN"),
+                    logging.ERROR: (config.RED, config.CROSS_MARK, "ERROR"),
+                    logging.CRITICAL: (config.RED, config.ERROR_ICON, "CRITICAL"),
+                }
+                self.prefijos = {
+                    nivel: (f"{ansi}{icono} [{nombre}]{config.NC} " if color else f"{icono} [{nombre}] ")
+                    for nivel, (ansi, icono, nombre) in niveles.items()
+                }
             
             def format(self, record):
-                # Formato con colores ANSI
-                if record.levelno == logging.DEBUG:
-                    return f"{self.config.MAGENTA}{self.config.CLOCK_ICON} [DEBUG]{self.config.NC} {record.getMessage()}"
-                elif record.levelno == logging.INFO:
-                    return f"{self.config.BLUE}{self.config.INFO_ICON} [INFO]{self.config.NC} {record.getMessage()}"
-                elif record.levelno == logging.WARNING:
-                    return f"{self.config.YELLOW}{self.config.WARNING_ICON} [WARN]{self.config.NC} {record.getMessage()}"
-                elif record.levelno == logging.ERROR:
-                    return f"{self.config.RED}{self.config.CROSS_MARK} [ERROR]{self.config.NC} {record.getMessage()}"
-                elif record.levelno == logging.CRITICAL:
-                    return f"{self.config.RED}{self.config.ERROR_ICON} [CRITICAL]{self.config.NC} {record.getMessage()}"
-                else:
-                    return f"{record.getMessage()}"
+                return self.prefijos.get(record.levelno, "") + record.getMessage()
         
         # Configurar logger principal
         self.logger = logging.getLogger('syncb')
@@ -455,26 +483,26 @@ class SyncBidireccional:
         file_handler.setFormatter(file_formatter)
         self.logger.addHandler(file_handler)
         
-    def log_info(self, msg):
+    def log_info(self, msg, *args):
         """Registra un mensaje informativo"""
-        self.logger.info(msg)
+        self.logger.info(msg, *args)
     
-    def log_warn(self, msg):
+    def log_warn(self, msg, *args):
         """Registra un mensaje de advertencia"""
-        self.logger.warning(msg)
+        self.logger.warning(msg, *args)
     
-    def log_error(self, msg):
+    def log_error(self, msg, *args):
         """Registra un mensaje de error"""
-        self.logger.error(msg)
+        self.logger.error(msg, *args)
     
-    def log_debug(self, msg):
-        """Registra un mensaje de debug"""
+    def log_debug(self, msg, *args):
+        """Registra un mensaje de debug (formato % diferido: sin coste si no es verbose)"""
         if self.verbose:
-            self.logger.debug(msg)
+            self.logger.debug(msg, *args)
     
-    def log_success(self, msg):
+    def log_success(self, msg, *args):
         """Registra un mensaje de éxito"""
-        self.logger.info(f"{self.config.GREEN}{self.config.CHECK_MARK} [SUCCESS]{self.config.NC} {msg}")
+        self.logger.info(f"{self.config.GREEN}{self.config.CHECK_MARK} [SUCCESS]{self.config.NC} {msg}", *args)
     
     def parse_arguments(self):
         """Procesa los argumentos de línea de comandos"""
@@ -503,10 +531,12 @@ class SyncBidireccional:
         parser.add_argument("--yes", action="store_true", help="Ejecuta sin confirmación")
         parser.add_argument("--backup-dir", action="store_true", help="Usa directorio de backup de solo lectura")
         parser.add_argument("--overwrite", action="store_true", help="Sobrescribe todos los archivos en destino")
+        parser.add_argument("--whole-file", action="store_true", help="Copia archivos completos sin transferencia delta")
         parser.add_argument("--checksum", action="store_true", help="Fuerza comparación con checksum")
         parser.add_argument("--bwlimit", type=int, help="Limita la velocidad de transferencia (KB/s)")
         parser.add_argument("--timeout", type=int, default=30, help="Límite de tiempo por operación (minutos)")
-        parser.add_argument("--force-unlock", action="store_true", help="Fuerza eliminación de lock")
+        parser.add_argument("--jobs", type=int, default=1, help="Número de elementos sincronizados en paralelo")
+        parser.add_argument("--force-unlock", action="store_true", help="Muestra quién tiene el lock (con flock nunca lo borra)")
         parser.add_argument("--crypto", action="store_true", help="Incluye la sincronización del directorio Crypto")  # NUEVO
         parser.add_argument("--verbose", action="store_true", help="Habilita modo verboso")
         parser.add_argument("--test", action="store_true", help="Ejecuta tests unitarios")
@@ -524,9 +554,13 @@ class SyncBidireccional:
         self.delete = args.delete
         self.yes = args.yes
         self.overwrite = args.overwrite
+        self.whole_file = args.whole_file
         self.use_checksum = args.checksum
         self.bw_limit = args.bwlimit
         self.timeout_minutes = args.timeout
+        if args.jobs < 1:
+            parser.error("--jobs debe ser al menos 1")
+        self.jobs = args.jobs
         self.verbose = args.verbose
         self.sync_crypto = args.crypto  # NUEVO
         
@@ -555,17 +589,60 @@ class SyncBidireccional:
             except Exception as e:
                 self.log_error(f"No se pudo cargar la configuración desde {args.config}: {e}")
                 sys.exit(1)
+        
+        # El directorio de pCloud ya no cambia durante la ejecución
+        self._pcloud_dir = self.get_pcloud_dir()
+        self._local_str = os.fspath(self.config.LOCAL_DIR)
+        self._local_prefijo = self._local_str + os.sep
+        self._pcloud_str = os.fspath(self._pcloud_dir)
+        
+        # Las opciones de rsync no dependen del elemento: se construyen una vez
+        self._rsync_opts = self.construir_opciones_rsync()
     
     def force_unlock(self):
-        """Fuerza la eliminación del archivo de lock"""
-        if self.LOCK_FILE.exists():
-            self.LOCK_FILE.unlink()
-            self.log_info("Lock eliminado forzosamente")
-        else:
+        """
+        Informa del dueño del lock sin borrar un lock en uso
+        
+        Con flock el archivo nunca se borra: si otro proceso mantiene el lock, una
+        nueva ejecución bloquearía un inodo distinto y correría en paralelo. El
+        kernel libera el lock al morir su dueño, así que si está libre solo se
+        limpia la información que quedó escrita. Sin fcntl el propio archivo es
+        el lock y borrarlo es la única forma de recuperar uno obsoleto.
+        """
+        if fcntl is None:
+            try:
+                self.LOCK_FILE.unlink()
+            except FileNotFoundError:
+                self.log_info("No existe archivo de lock")
+            else:
+                self.log_info("Lock eliminado forzosamente")
+            return
+        
+        try:
+            fd = os.open(self.LOCK_FILE, os.O_RDWR)
+        except FileNotFoundError:
             self.log_info("No existe archivo de lock")
+            return
+        
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                contenido = os.read(fd, 4096).decode('utf-8', errors='replace').split()
+                lock_pid = contenido[0] if contenido else "desconocido"
+                self.log_warn(f"El lock está en uso por el proceso {lock_pid}; no se elimina, "
+                              "se liberará cuando ese proceso termine")
+                return
+            # Lock libre: solo queda información de una ejecución ya terminada
+            os.ftruncate(fd, 0)
+            self.log_info("No hay lock activo (información obsoleta limpiada)")
+        finally:
+            os.close(fd)
     
     def get_pcloud_dir(self):
         """Obtiene el directorio de pCloud según el modo"""
+        if self._pcloud_dir is not None:
+            return self._pcloud_dir
         if self.backup_dir_mode == "readonly":
             return self.config.PCLOUD_BACKUP_READONLY
         else:
@@ -591,19 +668,36 @@ class SyncBidireccional:
         return self.config.directorios_sincronizacion
    
     def get_lista_sincronizacion(self):
-        """Obtiene la lista de elementos a sincronizar"""
+        """
+        Obtiene la lista de elementos a sincronizar
+        
+        La lista se resuelve y limpia (espacios, entradas vacías y comentarios)
+        una sola vez; banner, sincronización y enlaces reutilizan el resultado.
+        
+        Returns:
+            list: Elementos a sincronizar
+        """
+        if self._lista_sincronizacion is not None:
+            return self._lista_sincronizacion
+        
         # Si hay elementos específicos desde CLI, usarlos
         if self.items_especificos:
-            return self.items_especificos
-            
+            elementos = self.items_especificos
         # Si el hostname es el de RTVA, buscar lista específica
-        if self.hostname == self.config.HOSTNAME_RTVA:
-            # Buscar lista específica en la configuración
-            if 'host_specific' in self.config.config_data and self.hostname in self.config.config_data['host_specific']:
-                return self.config.config_data['host_specific'][self.hostname].get('directorios_sincronizacion', [])
-
-        # Devolver lista por defecto de la configuración
-        return self.config.directorios_sincronizacion
+        elif (self.hostname == self.config.HOSTNAME_RTVA and
+              self.hostname in self.config.config_data.get('host_specific', {})):
+            elementos = self.config.config_data['host_specific'][self.hostname].get('directorios_sincronizacion', [])
+        # Lista por defecto de la configuración
+        else:
+            elementos = self.config.directorios_sincronizacion
+        
+        lista = []
+        for elemento in elementos:
+            elemento = elemento.strip()
+            if elemento and elemento[0] != '#':
+                lista.append(elemento)
+        self._lista_sincronizacion = lista
+        return lista
 
     def get_exclusiones(self):
         """Obtiene la lista de exclusiones"""
@@ -611,6 +705,25 @@ class SyncBidireccional:
         exclusiones.extend(self.exclusiones_cli)
         return exclusiones
     
+    def get_archivo_exclusiones(self):
+        """
+        Obtiene el archivo de exclusiones combinado para --exclude-from
+        
+        Las exclusiones de configuración y CLI se escriben una sola vez, sin
+        duplicados, en un temporal que se elimina al salir.
+        
+        Returns:
+            str: Ruta al archivo de exclusiones, o None si no hay exclusiones
+        """
+        if self._archivo_exclusiones is None:
+            exclusiones = list(dict.fromkeys(self.get_exclusiones()))
+            if not exclusiones:
+                return None
+            with self.crear_temp_file(suffix='.excl', prefix='syncb_excl_', mode='w') as f:
+                f.write('\n'.join(exclusiones) + '\n')
+            self._archivo_exclusiones = f.name
+        return self._archivo_exclusiones
+    
     def verificar_pcloud_montado(self):
         """Verifica que pCloud esté montado correctamente con comprobaciones robustas"""
         pcloud_dir = self.get_pcloud_dir()
@@ -623,7 +736,10 @@ class SyncBidireccional:
         
         # 2. Verificar si el directorio está vacío (puede indicar que no está montado)
         try:
-            if not any(self.config.PCLOUD_MOUNT_POINT.iterdir()):
+            # scandir + next: basta con la primera entrada, sin crear Path ni hacer stat
+            with os.scandir(self.config.PCLOUD_MOUNT_POINT) as it:
+                vacio = next(it, None) is None
+            if vacio:
                 self.log_error(f"El directorio de pCloud está vacío: {self.config.PCLOUD_MOUNT_POINT}")
                 self.log_info("Esto sugiere que pCloud Drive no está montado correctamente.")
                 return False
@@ -640,35 +756,20 @@ class SyncBidireccional:
                 return False
         
         # 4. Verificación robusta usando diferentes métodos según el sistema operativo
-        sistema = platform.system()
+        sistema = SISTEMA
         montado = False
         
         try:
             if sistema == "Linux":
-                # Método 1: Usar findmnt (más preciso)
+                # Leer /proc/self/mountinfo directamente, sin lanzar findmnt/mountpoint
                 try:
-                    result = subprocess.run(["findmnt", "-rno", "TARGET", str(self.config.PCLOUD_MOUNT_POINT)], 
-                                          capture_output=True, text=True, timeout=5)
-                    montado = result.returncode == 0
-                except (subprocess.TimeoutExpired, FileNotFoundError):
-                    # Método 2: Verificar /proc/mounts
-                    with open('/proc/mounts', 'r') as f:
-                        mounts = f.read()
-                    montado = str(self.config.PCLOUD_MOUNT_POINT) in mounts
-                
-                # Método 3: Usar mountpoint
-                if not montado:
-                    try:
-                        result = subprocess.run(["mountpoint", "-q", str(self.config.PCLOUD_MOUNT_POINT)], 
-                                              timeout=5, check=False)
-                        montado = result.returncode == 0
-                    except (subprocess.TimeoutExpired, FileNotFoundError):
-                        pass
+                    montado = self.esta_montado(self.config.PCLOUD_MOUNT_POINT)
+                except OSError:
+                    montado = self.es_frontera_montaje(self.config.PCLOUD_MOUNT_POINT)
             
             elif sistema == "Darwin":  # macOS
-                # Método: Usar mount y buscar el punto de montaje
-                result = subprocess.run(["mount"], capture_output=True, text=True, timeout=5)
-                montado = str(self.config.PCLOUD_MOUNT_POINT) in result.stdout
+                # Un punto de montaje tiene distinto dispositivo que su directorio padre
+                montado = self.es_frontera_montaje(self.config.PCLOUD_MOUNT_POINT)
             
             else:
                 # Para otros sistemas, usar una verificación genérica
@@ -715,8 +816,9 @@ class SyncBidireccional:
         
         # 7. Verificación adicional: intentar listar contenido
         try:
-            # Intentar listar algunos elementos del directorio
-            list(pcloud_dir.iterdir())
+            # Intentar leer la primera entrada del directorio
+            with os.scandir(pcloud_dir) as it:
+                next(it, None)
         except Exception as e:
             self.log_error(f"Error accediendo al contenido de {pcloud_dir}: {e}")
             return False
@@ -724,6 +826,32 @@ class SyncBidireccional:
         self.log_info("Verificación de pCloud: OK - El directorio está montado y accesible")
         return True
     
+    def esta_montado(self, punto_montaje):
+        """
+        Comprueba en /proc/self/mountinfo si una ruta es un punto de montaje
+        
+        Args:
+            punto_montaje (Path): Ruta a comprobar
+            
+        Returns:
+            bool: True si aparece como punto de montaje
+            
+        Raises:
+            OSError: Si no se puede leer /proc/self/mountinfo
+        """
+        # mountinfo escapa espacio, tabulador, salto de línea y barra invertida en octal
+        objetivo = (str(punto_montaje).replace('\\', '\\134').replace(' ', '\\040')
+                    .replace('\t', '\\011').replace('\n', '\\012'))
+        with open('/proc/self/mountinfo', 'r') as f:
+            return any(linea.split(' ', 5)[4] == objetivo for linea in f)
+    
+    def es_frontera_montaje(self, punto_montaje):
+        """Comprueba si una ruta está en un dispositivo distinto al de su padre"""
+        try:
+            return os.stat(punto_montaje).st_dev != os.stat(os.path.dirname(punto_montaje)).st_dev
+        except OSError:
+            return False
+    
     def verificar_espacio_pcloud(self):
         """Verifica el espacio disponible en pCloud"""
         pcloud_dir = self.get_pcloud_dir()
@@ -747,7 +875,7 @@ class SyncBidireccional:
 
     def verificar_estado_pcloud(self):
         """Verifica el estado del cliente pCloud"""
-        sistema = platform.system()
+        sistema = SISTEMA
         
         try:
             if sistema == "Linux":
@@ -897,70 +1025,74 @@ class SyncBidireccional:
             sys.exit(1)
     
     def establecer_lock(self):
-        """Establece un lock para evitar ejecuciones concurrentes"""
-        if self.LOCK_FILE.exists():
-            # Leer información del lock existente
+        """
+        Establece un lock para evitar ejecuciones concurrentes
+        
+        Usa flock sobre el archivo de lock: el kernel resuelve la concurrencia de
+        forma atómica y libera el lock si el proceso muere, sin comprobar PIDs
+        ni edades. El archivo guarda una línea de texto con los datos del dueño.
+        
+        Returns:
+            bool: True si se obtuvo el lock
+        """
+        while True:
             try:
-                with open(self.LOCK_FILE, 'r') as f:
-                    lock_info = json.load(f)
-                
-                lock_pid = lock_info.get('pid')
-                lock_time = lock_info.get('timestamp', 0)
-                current_time = time.time()
-                lock_age = current_time - lock_time
-                
-                if lock_age > self.config.LOCK_TIMEOUT:
-                    self.log_warn(f"Eliminando lock obsoleto (edad: {lock_age:.0f}s > timeout: {self.config.LOCK_TIMEOUT}s)")
-                    self.LOCK_FILE.unlink()
+                if fcntl is None:
+                    fd = os.open(self.LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o644)
+                else:
+                    fd = os.open(self.LOCK_FILE, os.O_CREAT | os.O_RDWR, 0o644)
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (BlockingIOError, FileExistsError):
+                if fcntl is not None:
+                    contenido = os.read(fd, 4096).decode('utf-8', errors='replace').split()
+                    os.close(fd)
                 else:
-                    # Verificar si el proceso todavía existe
                     try:
-                        os.kill(lock_pid, 0)  # Verifica si el proceso existe
-                        self.log_error(f"Ya hay una ejecución en progreso (PID: {lock_pid})")
-                        self.log_error(f"Dueño del lock: PID {lock_pid}, Iniciado: {lock_info.get('start_time', 'desconocido')}")
-                        return False
+                        contenido = self.LOCK_FILE.read_text(encoding='utf-8', errors='replace').split()
                     except OSError:
-                        # El proceso ya no existe
-                        self.log_warn(f"Eliminando lock obsoleto del proceso {lock_pid}")
-                        self.LOCK_FILE.unlink()
-            except (json.JSONDecodeError, IOError):
-                # El archivo de lock está corrupto o no se puede leer
-                self.log_warn("Eliminando lock corrupto")
-                self.LOCK_FILE.unlink()
-        
-        # Crear nuevo lock
-        lock_info = {
-            'pid': os.getpid(),
-            'timestamp': time.time(),
-            'start_time': datetime.datetime.now().isoformat(),
-            'modo': self.modo,
-            'user': os.getlogin(),
-            'hostname': self.hostname
-        }
-        
-        try:
-            with open(self.LOCK_FILE, 'w') as f:
-                json.dump(lock_info, f)
-            self.log_info(f"Lock establecido: {self.LOCK_FILE}")
-            return True
-        except IOError as e:
-            self.log_error(f"No se pudo crear el archivo de lock: {e}")
-            return False
+                        contenido = []
+                lock_pid = contenido[0] if contenido else "desconocido"
+                inicio = contenido[1] if len(contenido) > 1 else "desconocido"
+                self.log_error(f"Ya hay una ejecución en progreso (PID: {lock_pid})")
+                self.log_error(f"Dueño del lock: PID {lock_pid}, Iniciado: {inicio}")
+                return False
+            except OSError as e:
+                self.log_error(f"No se pudo crear el archivo de lock: {e}")
+                return False
+            
+            # Si el dueño anterior borró el archivo entre open y flock, el lock
+            # obtenido es sobre un inodo huérfano: reintentar con el archivo nuevo
+            try:
+                vigente = os.fstat(fd).st_ino == os.stat(self.LOCK_FILE).st_ino
+            except FileNotFoundError:
+                vigente = False
+            if vigente:
+                break
+            os.close(fd)
+        
+        # pid inicio modo usuario hostname
+        linea = (f"{os.getpid()} {datetime.datetime.now().isoformat()} {self.modo} "
+                 f"{self._usuario} {self.hostname}\n")
+        os.ftruncate(fd, 0)
+        os.write(fd, linea.encode('utf-8'))
+        self._lock_fd = fd
+        self.log_info(f"Lock establecido: {self.LOCK_FILE}")
+        return True
     
     def eliminar_lock(self):
         """Elimina el lock si pertenece a este proceso"""
-        if self.LOCK_FILE.exists():
-            try:
-                with open(self.LOCK_FILE, 'r') as f:
-                    lock_info = json.load(f)
-                
-                if lock_info.get('pid') == os.getpid():
-                    self.LOCK_FILE.unlink()
-                    self.log_info("Lock eliminado")
-            except (json.JSONDecodeError, IOError):
-                # Si no podemos leer el lock, lo eliminamos de todas formas
-                self.LOCK_FILE.unlink()
-                self.log_info("Lock eliminado (forzado)")
+        if self._lock_fd is None:
+            return
+        # Borrar antes de liberar: quien espere el lock no puede quedarse con el archivo viejo
+        try:
+            os.unlink(self.LOCK_FILE)
+        except FileNotFoundError:
+            pass
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+        self.log_info("Lock eliminado")
     
     def construir_opciones_rsync(self):
         """Construye las opciones para el comando rsync"""
@@ -969,11 +1101,14 @@ class SyncBidireccional:
             "--verbose",
             "--times",
             "--progress",
-            "--whole-file",
             "--no-links",
             "--itemize-changes"
         ]
         
+        # Sin --whole-file rsync envía solo los bloques modificados
+        if self.whole_file or self.overwrite:
+            opts.append("--whole-file")
+        
         if not self.overwrite:
             opts.append("--update")
         
@@ -990,108 +1125,251 @@ class SyncBidireccional:
             opts.append(f"--bwlimit={self.bw_limit}")
         
         # Añadir exclusiones desde configuración y CLI
-        exclusiones = self.get_exclusiones()
-        for patron in exclusiones:
-            opts.append(f"--exclude={patron}")
+        archivo_exclusiones = self.get_archivo_exclusiones()
+        if archivo_exclusiones:
+            opts.append(f"--exclude-from={archivo_exclusiones}")
         
         return opts
     
+    def crear_directorio_destino(self, ruta):
+        """
+        Crea el directorio destino si no existe (en dry-run solo lo informa)
+        
+        Se intenta mkdir directamente: si el directorio ya existe basta con una
+        llamada, sin un stat previo contra el montaje de pCloud.
+        
+        Args:
+            ruta (str): Directorio a crear
+        """
+        if self.dry_run:
+            if not os.path.exists(ruta):
+                self.log_info(f"SIMULACIÓN: Se crearía directorio: {ruta}")
+            return
+        try:
+            os.mkdir(ruta)
+        except FileExistsError:
+            return
+        except FileNotFoundError:
+            os.makedirs(ruta, exist_ok=True)
+        self.log_info(f"Directorio creado: {ruta}")
+    
     def sincronizar_elemento(self, elemento):
         """Sincroniza un elemento individual"""
-        pcloud_dir = self.get_pcloud_dir()
-        
         if self.modo == "subir":
-            origen = self.config.LOCAL_DIR / elemento
-            destino = pcloud_dir / elemento
+            origen = self._local_str + os.sep + elemento
+            destino = self._pcloud_str + os.sep + elemento
             direccion = "LOCAL → PCLOUD (Subir)"
         else:
-            origen = pcloud_dir / elemento
-            destino = self.config.LOCAL_DIR / elemento
+            origen = self._pcloud_str + os.sep + elemento
+            destino = self._local_str + os.sep + elemento
             direccion = "PCLOUD → LOCAL (Bajar)"
         
         # Verificar si el origen existe
-        if not origen.exists():
+        if not os.path.exists(origen):
             self.log_warn(f"No existe {origen}")
             return False
         
         # Normalizar si es directorio
-        if origen.is_dir():
-            origen = Path(str(origen) + "/")
-            destino = Path(str(destino) + "/")
+        sufijo = "/" if os.path.isdir(origen) else ""
         
         # Advertencia si tiene espacios
-        if " " in str(elemento):
+        if " " in elemento:
             self.log_warn(f"El elemento contiene espacios: '{elemento}'")
         
         # Crear directorio destino si no existe
-        dir_destino = destino.parent
-        if not dir_destino.exists() and not self.dry_run:
-            dir_destino.mkdir(parents=True, exist_ok=True)
-            self.log_info(f"Directorio creado: {dir_destino}")
-        elif not dir_destino.exists() and self.dry_run:
-            self.log_info(f"SIMULACIÓN: Se crearía directorio: {dir_destino}")
+        self.crear_directorio_destino(os.path.dirname(destino.rstrip("/")))
         
         self.log_info(f"{self.config.BLUE}Sincronizando: {elemento} ({direccion}){self.config.NC}")
         
         # Construir comando rsync
-        opts = self.construir_opciones_rsync()
-        cmd = ["rsync"] + opts + [str(origen), str(destino)]
+        cmd = ["rsync"] + self._rsync_opts + [f"{origen}{sufijo}", f"{destino}{sufijo}"]
         
         # Ejecutar comando
         try:
-            self.log_debug(f"Ejecutando: {' '.join(cmd)}")
+            if self.verbose:
+                self.log_debug("Ejecutando: %s", ' '.join(cmd))
             
-            if self.dry_run:
-                # En dry-run, solo mostramos el comando
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout_minutes * 60)
-                if result.returncode == 0:
-                    self.analizar_salida_rsync(result.stdout)
-                    self.log_success(f"Sincronización completada: {elemento}")
-                    return True
-                else:
-                    self.log_error(f"Error en simulación: {elemento}")
-                    return False
+            returncode, contadores, _ = self.ejecutar_rsync(cmd, self.timeout_minutes * 60)
+            if returncode == 0:
+                self.analizar_salida_rsync(contadores)
+                self.log_success(f"Sincronización completada: {elemento}")
+                return True
+            elif self.dry_run:
+                self.log_error(f"Error en simulación: {elemento}")
+                return False
             else:
-                # Ejecución real
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout_minutes * 60)
-                if result.returncode == 0:
-                    self.analizar_salida_rsync(result.stdout)
-                    self.log_success(f"Sincronización completada: {elemento}")
-                    return True
-                else:
-                    self.log_error(f"Error en sincronización: {elemento}")
+                self.log_error(f"Error en sincronización: {elemento}")
+                with self._stats_lock:
                     self.errores_sincronizacion += 1
-                    return False
+                return False
         except subprocess.TimeoutExpired:
             self.log_error(f"TIMEOUT: La sincronización de '{elemento}' excedió el límite")
-            self.errores_sincronizacion += 1
+            with self._stats_lock:
+                self.errores_sincronizacion += 1
             return False
         except Exception as e:
             self.log_error(f"Error ejecutando rsync: {e}")
-            self.errores_sincronizacion += 1
+            with self._stats_lock:
+                self.errores_sincronizacion += 1
             return False
     
-    def analizar_salida_rsync(self, output):
-        """Analiza la salida de rsync para obtener estadísticas"""
-        lineas = output.split('\n')
+    def sincronizar_lote(self, elementos):
+        """
+        Sincroniza todos los elementos con una única invocación de rsync
         
-        # Contar archivos creados y actualizados
-        creados = sum(1 for linea in lineas if linea.startswith('>f'))
-        actualizados = sum(1 for linea in lineas if linea.startswith('>f.st'))
-        count = sum(1 for linea in lineas if linea.startswith(('>', '<')))
+        Los elementos se pasan con --files-from (relativos a la base de origen), así
+        rsync arranca una vez y recorre el árbol una vez en lugar de una por elemento.
         
-        # Contar borrados si se usa --delete
-        if self.delete:
-            borrados = sum(1 for linea in lineas if '*deleting' in linea)
-            self.archivos_borrados += borrados
-            self.log_info(f"Archivos borrados: {borrados}")
+        Args:
+            elementos (list): Rutas relativas a LOCAL_DIR / directorio de pCloud
+            
+        Returns:
+            bool: True si todos los elementos existen y rsync termina sin errores
+        """
+        if self.modo == "subir":
+            origen_base = self._local_str
+            destino_base = self._pcloud_str
+            direccion = "LOCAL → PCLOUD (Subir)"
+        else:
+            origen_base = self._pcloud_str
+            destino_base = self._local_str
+            direccion = "PCLOUD → LOCAL (Bajar)"
         
-        # Actualizar contadores globales
-        self.archivos_transferidos += count
-        self.elementos_procesados += 1
+        # Verificar que cada origen existe
+        todo_ok = True
+        existentes = []
+        for elemento in elementos:
+            origen = origen_base + os.sep + elemento
+            if not os.path.exists(origen):
+                self.log_warn(f"No existe {origen}")
+                todo_ok = False
+                continue
+            # Advertencia si tiene espacios
+            if " " in elemento:
+                self.log_warn(f"El elemento contiene espacios: '{elemento}'")
+            existentes.append(elemento.strip("/"))
+        
+        if not existentes:
+            return todo_ok
+        
+        # Crear directorio destino si no existe (rsync crea los intermedios al implicar --relative)
+        self.crear_directorio_destino(destino_base)
+        
+        self.log_info(f"{self.config.BLUE}Sincronizando {len(existentes)} elementos ({direccion}){self.config.NC}")
+        
+        with self.manejo_temporal_context() as temporales:
+            # Lista separada por NUL (--from0): admite cualquier nombre de archivo
+            lista = temporales.temp_file(suffix='.lst', prefix='syncb_files_')
+            lista.write(b"\0".join(os.fsencode(elemento) for elemento in existentes))
+            lista.close()
+            
+            cmd = ["rsync"] + self._rsync_opts + ["--from0", f"--files-from={lista.name}",
+                                                  f"{origen_base}/", f"{destino_base}/"]
+            
+            try:
+                if self.verbose:
+                    self.log_debug("Ejecutando: %s", ' '.join(cmd))
+                # El límite de tiempo es por elemento, como cuando se lanzaba un rsync por cada uno
+                returncode, contadores, _ = self.ejecutar_rsync(
+                    cmd, self.timeout_minutes * 60 * len(existentes))
+            except subprocess.TimeoutExpired:
+                self.log_error("TIMEOUT: La sincronización excedió el límite")
+                self.errores_sincronizacion += 1
+                return False
+            except Exception as e:
+                self.log_error(f"Error ejecutando rsync: {e}")
+                self.errores_sincronizacion += 1
+                return False
+        
+        if returncode != 0:
+            if self.dry_run:
+                self.log_error(f"Error en simulación (código: {returncode})")
+            else:
+                self.log_error(f"Error en sincronización (código: {returncode})")
+                self.errores_sincronizacion += 1
+            return False
         
-        self.log_info(f"Archivos creados: {creados}")
-        self.log_info(f"Archivos actualizados: {actualizados}")
+        self.analizar_salida_rsync(contadores, elementos=len(existentes))
+        self.log_success(f"Sincronización completada: {len(existentes)} elementos")
+        return todo_ok
+    
+    def ejecutar_rsync(self, cmd, timeout):
+        """
+        Ejecuta rsync leyendo su salida en streaming
+        
+        Los contadores se actualizan línea a línea mientras rsync trabaja, sin
+        acumular toda la salida en memoria. La salida se lee en bytes: los
+        prefijos de --itemize-changes son ASCII y no hace falta decodificarla.
+        
+        Args:
+            cmd (list): Comando rsync completo
+            timeout (float): Límite de tiempo en segundos
+            
+        Returns:
+            tuple: (código de salida, contadores de la salida, stderr como texto)
+            
+        Raises:
+            subprocess.TimeoutExpired: Si rsync excede el límite de tiempo
+        """
+        contadores = {'creados': 0, 'actualizados': 0, 'transferidos': 0, 'borrados': 0}
+        
+        # stderr a un temporal: un segundo pipe sin leer podría llenarse y bloquear a rsync
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+            vencido = threading.Event()
+            
+            def matar():
+                vencido.set()
+                proc.kill()
+            
+            temporizador = threading.Timer(timeout, matar)
+            temporizador.start()
+            try:
+                with proc.stdout:
+                    for linea in proc.stdout:
+                        self.contar_linea_rsync(linea, contadores)
+                proc.wait()
+            finally:
+                temporizador.cancel()
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            
+            if vencido.is_set():
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            
+            err.seek(0)
+            return proc.returncode, contadores, err.read().decode('utf-8', errors='replace')
+    
+    def contar_linea_rsync(self, linea, contadores):
+        """Actualiza los contadores con una línea (bytes) de --itemize-changes"""
+        # Una sola clasificación por el primer byte de la línea
+        c = linea[:1]
+        if c == b'>' or c == b'<':
+            contadores['transferidos'] += 1
+            if linea.startswith(b'>f'):
+                contadores['creados'] += 1
+                if linea.startswith(b'>f.st'):
+                    contadores['actualizados'] += 1
+        elif c == b'*' and linea.startswith(b'*deleting'):
+            contadores['borrados'] += 1
+    
+    def analizar_salida_rsync(self, contadores, elementos=1):
+        """Actualiza las estadísticas con los contadores de la salida de rsync"""
+        with self._stats_lock:
+            # Contar borrados si se usa --delete
+            if self.delete:
+                self.archivos_borrados += contadores['borrados']
+            
+            # Actualizar contadores globales
+            self.archivos_transferidos += contadores['transferidos']
+            self.elementos_procesados += elementos
+        
+        if self.delete:
+            self.log_info(f"Archivos borrados: {contadores['borrados']}")
+        
+        self.log_info(f"Archivos creados: {contadores['creados']}")
+        self.log_info(f"Archivos actualizados: {contadores['actualizados']}")
     
     # NUEVA FUNCIÓN: Sincronización de directorio Crypto
     def sincronizar_crypto(self):
@@ -1122,13 +1400,11 @@ class SyncBidireccional:
             if not self.dry_run:
                 origen.mkdir(parents=True, exist_ok=True)
         
-        # Normalizar si es directorio
-        if origen.is_dir():
-            origen = Path(str(origen) + "/")
-            destino = Path(str(destino) + "/")
+        # Normalizar si es directorio (Path eliminaría la barra final)
+        sufijo = "/" if origen.is_dir() else ""
         
         print("------------------------------------------")
-        self.log_info(f"{self.config.BLUE}Sincronizando Crypto: {origen} -> {destino} ({direccion}){self.config.NC}")
+        self.log_info(f"{self.config.BLUE}Sincronizando Crypto: {origen}{sufijo} -> {destino}{sufijo} ({direccion}){self.config.NC}")
         self.log_info("Iniciando sincronización de directorio Crypto...")
         
         # Construir opciones de rsync específicas para Crypto
@@ -1137,10 +1413,12 @@ class SyncBidireccional:
             "--verbose",
             "--times",
             "--progress",
-            "--whole-file",
             "--itemize-changes"
         ]
         
+        if self.whole_file or self.overwrite:
+            crypto_opts.append("--whole-file")
+        
         if not self.overwrite:
             crypto_opts.append("--update")
         
@@ -1156,10 +1434,10 @@ class SyncBidireccional:
         # Excluir el archivo de verificación de montaje
         crypto_opts.append(f"--exclude={self.config.CLOUD_MOUNT_CHECK_FILE}")
         
-        # Añadir exclusiones de línea de comandos
-        exclusiones = self.get_exclusiones()
-        for patron in exclusiones:
-            crypto_opts.append(f"--exclude={patron}")
+        # Añadir exclusiones de configuración y línea de comandos
+        archivo_exclusiones = self.get_archivo_exclusiones()
+        if archivo_exclusiones:
+            crypto_opts.append(f"--exclude-from={archivo_exclusiones}")
         
         # Sincronizar Keepass2Android (pcloud -> ~/Cripto) - siempre en ambas direcciones
         self.log_info("Sincronizando Keepass2Android...")
@@ -1169,7 +1447,8 @@ class SyncBidireccional:
         ]
         
         try:
-            self.log_debug(f"Ejecutando Keepass sync: {' '.join(keepass_cmd)}")
+            if self.verbose:
+                self.log_debug("Ejecutando Keepass sync: %s", ' '.join(keepass_cmd))
             result_keepass = subprocess.run(keepass_cmd, capture_output=True, text=True, 
                                           timeout=self.timeout_minutes * 60)
             if result_keepass.returncode != 0:
@@ -1178,39 +1457,27 @@ class SyncBidireccional:
             self.log_error(f"Error en sincronización Keepass2Android: {e}")
         
         # Sincronizar directorio Crypto principal
-        crypto_cmd = ["rsync"] + crypto_opts + [str(origen), str(destino)]
+        crypto_cmd = ["rsync"] + crypto_opts + [f"{origen}{sufijo}", f"{destino}{sufijo}"]
         
         try:
-            self.log_debug(f"Ejecutando Crypto sync: {' '.join(crypto_cmd)}")
+            if self.verbose:
+                self.log_debug("Ejecutando Crypto sync: %s", ' '.join(crypto_cmd))
             
-            # Usar archivo temporal para capturar salida
-            with self.manejo_temporal_context() as temp_ctx:
-                temp_output = temp_ctx.temp_file(suffix='.crypto_output', mode='w+')
-                
-                if self.dry_run:
-                    result = subprocess.run(crypto_cmd, stdout=temp_output, stderr=subprocess.STDOUT, 
-                                          text=True, timeout=self.timeout_minutes * 60)
-                else:
-                    result = subprocess.run(crypto_cmd, stdout=temp_output, stderr=subprocess.STDOUT,
-                                          timeout=self.timeout_minutes * 60)
-                
-                # Analizar salida para contar archivos transferidos
-                temp_output.seek(0)
-                output_content = temp_output.read()
-                crypto_count = sum(1 for linea in output_content.split('\n') 
-                                 if linea.startswith(('>', '<')))
-                self.archivos_crypto_transferidos += crypto_count
+            # Los archivos transferidos se cuentan mientras rsync escribe su salida
+            returncode, contadores, _ = self.ejecutar_rsync(crypto_cmd, self.timeout_minutes * 60)
+            crypto_count = contadores['transferidos']
+            self.archivos_crypto_transferidos += crypto_count
             
-            if result.returncode == 0:
+            if returncode == 0:
                 self.log_success(f"Sincronización Crypto completada: {crypto_count} archivos transferidos")
                 print("------------------------------------------")
                 return True
-            elif result.returncode == 124:  # timeout
+            elif returncode == 124:  # timeout
                 self.log_error("TIMEOUT: La sincronización Crypto excedió el límite")
                 self.errores_sincronizacion += 1
                 return False
             else:
-                self.log_error(f"Error en sincronización Crypto (código: {result.returncode})")
+                self.log_error(f"Error en sincronización Crypto (código: {returncode})")
                 self.errores_sincronizacion += 1
                 return False
                 
@@ -1230,17 +1497,21 @@ class SyncBidireccional:
         elementos = self.get_lista_sincronizacion()
  
         if self.items_especificos:
-            self.log_info(f"Sincronizando {len(self.items_especificos)} elementos específicos")
-            for elemento in self.items_especificos:
-                if not self.sincronizar_elemento(elemento):
-                    exit_code = 1
-                print("-" * 50)
+            self.log_info(f"Sincronizando {len(elementos)} elementos específicos")
         else:
             self.log_info(f"Procesando lista de sincronización: {len(elementos)} elementos")
-            for elemento in elementos:
-                if not self.sincronizar_elemento(elemento):
-                    exit_code = 1
-                print("-" * 50)
+        
+        if self.jobs > 1:
+            # Un rsync por elemento, varios a la vez: los elementos son subárboles
+            # disjuntos y cada rsync pasa la mayor parte del tiempo esperando E/S
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                for ok in pool.map(self.sincronizar_elemento, elementos):
+                    if not ok:
+                        exit_code = 1
+        # Un único rsync para todos los elementos
+        elif not self.sincronizar_lote(elementos):
+            exit_code = 1
+        print("-" * 50)
         
         return exit_code
     
@@ -1255,82 +1526,147 @@ class SyncBidireccional:
         """Genera el archivo de metadatos de enlaces simbólicos"""
         pcloud_dir = self.get_pcloud_dir()
         
-        # Usar el nuevo sistema de temporales
-        with self.manejo_temporal_context() as temp_ctx:
-            archivo_enlaces = temp_ctx.temp_file(suffix='.meta', mode='w')
+        try:
+            self.log_info("Generando archivo de enlaces simbólicos...")
             
-            try:
-                self.log_info("Generando archivo de enlaces simbólicos...")
-                
-                elementos = self.items_especificos if self.items_especificos else self.get_lista_sincronizacion()
-                
-                for elemento in elementos:
-                    ruta_completa = self.config.LOCAL_DIR / elemento
-                    
-                    if ruta_completa.is_symlink():
-                        self.registrar_enlace(ruta_completa, archivo_enlaces)
-                    elif ruta_completa.is_dir():
-                        self.buscar_enlaces_en_directorio(ruta_completa, archivo_enlaces)
-                
-                archivo_enlaces.close()
-                
-                # Sincronizar archivo de enlaces a pCloud
-                if os.path.getsize(archivo_enlaces.name) > 0:
-                    self.log_info("Sincronizando archivo de enlaces...")
-                    opts = self.construir_opciones_rsync()
-                    cmd = ["rsync"] + opts + [archivo_enlaces.name, f"{pcloud_dir}/{self.config.SYMLINKS_FILE}"]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode == 0:
-                        self.log_info(f"Enlaces detectados/guardados en meta: {self.enlaces_detectados}")
-                        self.log_info("Archivo de enlaces sincronizado")
-                    else:
-                        self.log_error("Error sincronizando archivo de enlaces")
-                        return False
-                else:
-                    self.log_info("No se encontraron enlaces simbólicos para registrar")
+            elementos = self.get_lista_sincronizacion()
+            
+            # Las líneas se acumulan en memoria y se escriben de una vez
+            lineas = []
+            for elemento in elementos:
+                ruta_completa = os.fspath(self.config.LOCAL_DIR / elemento)
                 
+                # Un único lstat para distinguir enlace y directorio
+                try:
+                    modo = os.lstat(ruta_completa).st_mode
+                except OSError:
+                    continue
+                if stat.S_ISLNK(modo):
+                    self.registrar_enlace(ruta_completa, lineas)
+                elif stat.S_ISDIR(modo):
+                    self.buscar_enlaces_en_directorio(ruta_completa, lineas)
+            
+            # Cada línea es un enlace registrado; se cuenta aquí y no en los hilos
+            self.enlaces_detectados += len(lineas)
+            
+            if not lineas:
+                self.log_info("No se encontraron enlaces simbólicos para registrar")
                 return True
-            except Exception as e:
-                self.log_error(f"Error generando archivo de enlaces: {e}")
-                return False
+            
+            # pCloud está montado: el archivo se escribe directamente en su destino,
+            # sin un rsync aparte, a través de un temporal y os.replace (atómico)
+            if self.dry_run:
+                self.log_info(f"SIMULACIÓN: Se guardaría el archivo de enlaces en {pcloud_dir}")
+            else:
+                self.log_info("Guardando archivo de enlaces en pCloud...")
+                f = tempfile.NamedTemporaryFile(mode='w', dir=pcloud_dir, prefix='.syncb_links_',
+                                                delete=False)
+                try:
+                    # Un fallo al escribir (p. ej. ENOSPC en el montaje) tampoco deja el temporal
+                    with f:
+                        f.writelines(lineas)
+                    os.replace(f.name, pcloud_dir / self.config.SYMLINKS_FILE)
+                except Exception:
+                    try:
+                        os.unlink(f.name)
+                    except OSError:
+                        pass
+                    raise
+            
+            self.log_info(f"Enlaces detectados/guardados en meta: {self.enlaces_detectados}")
+            self.log_info("Archivo de enlaces sincronizado")
+            return True
+        except Exception as e:
+            self.log_error(f"Error generando archivo de enlaces: {e}")
+            return False
     
-    def registrar_enlace(self, enlace, archivo):
-        """Registra un enlace simbólico en el archivo de metadatos"""
+    def registrar_enlace(self, enlace, lineas):
+        """Añade la línea de metadatos de un enlace simbólico (ruta en cadena) a la lista"""
         try:
-            # Ruta relativa del enlace
-            ruta_relativa = enlace.relative_to(self.config.LOCAL_DIR)
+            # Ruta relativa del enlace: las rutas recorridas cuelgan de LOCAL_DIR
+            prefijo = self._local_prefijo
+            if not enlace.startswith(prefijo):
+                raise ValueError(f"{enlace} no está dentro de {self.config.LOCAL_DIR}")
+            ruta_relativa = enlace[len(prefijo):]
             
             # Destino del enlace
-            destino = os.readlink(str(enlace))
+            destino = os.readlink(enlace)
             
-            # Normalización del destino
-            if destino.startswith(str(self.config.LOCAL_DIR)):
-                destino = destino.replace(str(self.config.LOCAL_DIR), "/home/$USERNAME", 1)
+            # Normalización del destino (prefijos precalculados y cortes, sin replace)
+            if destino == self._local_str or destino.startswith(prefijo):
+                destino = "/home/$USERNAME" + destino[len(self._local_str):]
             elif destino.startswith("/home/"):
                 # Reemplazar nombre de usuario específico por variable
-                partes = destino.split('/')
-                if len(partes) >= 3:
-                    destino = f"/home/$USERNAME/{'/'.join(partes[3:])}"
-            
-            # Escribir en archivo
-            archivo.write(f"{ruta_relativa}\t{destino}\n")
-            self.enlaces_detectados += 1
-            self.log_debug(f"Registrado enlace: {ruta_relativa} -> {destino}")
+                partes = destino.split('/', 3)
+                destino = "/home/$USERNAME" + ('/' + partes[3] if len(partes) > 3 else '')
+            
+            lineas.append(f"{ruta_relativa}\t{destino}\n")
+            self.log_debug("Registrado enlace: %s -> %s", ruta_relativa, destino)
         except Exception as e:
             self.log_error(f"Error registrando enlace {enlace}: {e}")
     
-    def buscar_enlaces_en_directorio(self, directorio, archivo):
-        """Busca enlaces simbólicos en un directorio"""
+    def buscar_enlaces_en_directorio(self, directorio, lineas):
+        """
+        Busca enlaces simbólicos en un directorio
+        
+        Cada subdirectorio de primer nivel se recorre en un hilo propio: el
+        recorrido es E/S (readdir/readlink) y el GIL se libera en esas llamadas.
+        Los resultados se añaden en el orden de los subdirectorios.
+        
+        Args:
+            directorio (str): Directorio a recorrer
+            lineas (list): Lista donde se añaden las líneas de metadatos
+        """
         try:
-            for root, dirs, files in os.walk(str(directorio)):
-                for name in files + dirs:
-                    ruta_completa = Path(root) / name
-                    if ruta_completa.is_symlink():
-                        self.registrar_enlace(ruta_completa, archivo)
+            subdirectorios = []
+            with os.scandir(directorio) as it:
+                for entrada in it:
+                    if entrada.is_symlink():
+                        self.registrar_enlace(entrada.path, lineas)
+                    elif entrada.is_dir(follow_symlinks=False):
+                        subdirectorios.append(entrada.path)
+            
+            if len(subdirectorios) < 2:
+                for subdirectorio in subdirectorios:
+                    lineas.extend(self.recorrer_enlaces(subdirectorio))
+                return
+            
+            hilos = min(32, (os.cpu_count() or 1) * 4, len(subdirectorios))
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                for resultado in pool.map(self.recorrer_enlaces, subdirectorios):
+                    lineas.extend(resultado)
         except Exception as e:
             self.log_error(f"Error buscando enlaces en {directorio}: {e}")
     
+    def recorrer_enlaces(self, directorio):
+        """
+        Recorre un árbol de directorios y devuelve las líneas de sus enlaces
+        
+        Recorrido con scandir: el tipo de cada entrada sale de readdir, sin
+        stat/lstat por archivo, y cada directorio se lee una sola vez.
+        
+        Args:
+            directorio (str): Raíz del recorrido
+            
+        Returns:
+            list: Líneas de metadatos de los enlaces encontrados
+        """
+        lineas = []
+        pendientes = [directorio]
+        while pendientes:
+            try:
+                it = os.scandir(pendientes.pop())
+            except OSError:
+                # Como os.walk: los directorios ilegibles se omiten
+                continue
+            with it:
+                for entrada in it:
+                    if entrada.is_symlink():
+                        self.registrar_enlace(entrada.path, lineas)
+                    elif entrada.is_dir(follow_symlinks=False):
+                        pendientes.append(entrada.path)
+        return lineas
+    
     def recrear_enlaces_desde_archivo(self):
         """Recrea enlaces simbólicos desde el archivo de metadatos"""
         pcloud_dir = self.get_pcloud_dir()
@@ -1339,37 +1675,31 @@ class SyncBidireccional:
         
         self.log_info("Buscando archivo de enlaces...")
         
-        # Usar el nuevo sistema de temporales
-        with self.manejo_temporal_context() as temp_ctx:
-            # Copiar archivo localmente si existe en pCloud
-            archivo_enlaces_origen = pcloud_dir / self.config.SYMLINKS_FILE
-            if archivo_enlaces_origen.exists():
-                shutil.copy2(str(archivo_enlaces_origen), str(archivo_enlaces_local))
-                self.log_info("Archivo de enlaces copiado localmente")
-                # Registrar para cleanup
-                self.registrar_temp_file(str(archivo_enlaces_local))
-            elif archivo_enlaces_local.exists():
-                self.log_info("Usando archivo de enlaces local existente")
-                # Registrar para cleanup
-                self.registrar_temp_file(str(archivo_enlaces_local))
-            else:
-                self.log_info("No se encontró archivo de enlaces, omitiendo recreación")
-                return True
+        # Leer directamente el archivo de pCloud, sin copiarlo antes al directorio local;
+        # una copia local (p. ej. de una ejecución anterior) solo se usa si falta en pCloud
+        if archivo_enlaces_origen.exists():
+            archivo_enlaces = archivo_enlaces_origen
+        elif archivo_enlaces_local.exists():
+            self.log_info("Usando archivo de enlaces local existente")
+            archivo_enlaces = archivo_enlaces_local
+            # Registrar para cleanup
+            self.registrar_temp_file(str(archivo_enlaces_local))
+        else:
+            self.log_info("No se encontró archivo de enlaces, omitiendo recreación")
+            return True
         
         self.log_info("Recreando enlaces simbólicos...")
         exit_code = 0
         
         try:
-            with open(archivo_enlaces_local, 'r', encoding='utf-8') as f:
-                for linea in f:
-                    linea = linea.strip()
-                    if not linea or '\t' not in linea:
-                        continue
-                    
-                    ruta_enlace, destino = linea.split('\t', 1)
-                    
-                    if not self.procesar_linea_enlace(ruta_enlace, destino):
-                        exit_code = 1
+            # Una sola lectura y un solo análisis de todo el archivo
+            with open(archivo_enlaces, 'r', encoding='utf-8') as f:
+                datos = f.read()
+            pares = [linea.split('\t', 1) for linea in datos.splitlines() if '\t' in linea]
+            
+            for ruta_enlace, destino in pares:
+                if not self.procesar_linea_enlace(ruta_enlace, destino):
+                    exit_code = 1
             
             self.log_info(f"Enlaces recreados: {self.enlaces_creados}, Errores: {self.enlaces_errores}")
             return exit_code == 0
@@ -1380,36 +1710,46 @@ class SyncBidireccional:
     def procesar_linea_enlace(self, ruta_enlace, destino):
         """Procesa una línea del archivo de enlaces"""
         try:
-            ruta_completa = self.config.LOCAL_DIR / ruta_enlace
-            dir_padre = ruta_completa.parent
+            # Rutas como cadenas (os.path), sin objetos Path por línea
+            ruta_completa = os.path.join(self._local_str, ruta_enlace)
+            dir_padre = os.path.dirname(ruta_completa)
             
-            # Normalizar destino
-            destino = destino.replace('$USERNAME', os.getlogin())
+            # Normalizar destino: primero el prefijo /home/$USERNAME, luego la variable suelta
             if destino.startswith('/home/$USERNAME'):
-                destino = destino.replace('/home/$USERNAME', str(self.config.LOCAL_DIR), 1)
+                destino = self._local_str + destino[len('/home/$USERNAME'):]
+            if '$USERNAME' in destino:
+                destino = destino.replace('$USERNAME', self._usuario)
             
-            # Crear directorio padre si no existe
-            if not dir_padre.exists() and not self.dry_run:
-                dir_padre.mkdir(parents=True, exist_ok=True)
+            # Crear directorio padre si no existe (exist_ok evita un stat previo)
+            if not self.dry_run:
+                os.makedirs(dir_padre, exist_ok=True)
             
-            # Si ya existe y apunta a lo mismo
-            if ruta_completa.is_symlink():
-                destino_actual = os.readlink(str(ruta_completa))
+            # readlink directo: distingue enlace existente (y su destino), ruta
+            # inexistente (ENOENT) y archivo que no es enlace (EINVAL) en una llamada
+            try:
+                destino_actual = os.readlink(ruta_completa)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+            else:
+                # Si ya existe y apunta a lo mismo
                 if destino_actual == destino:
-                    self.log_debug(f"Enlace ya existe y es correcto: {ruta_enlace} -> {destino}")
+                    self.log_debug("Enlace ya existe y es correcto: %s -> %s", ruta_enlace, destino)
                     self.enlaces_existentes += 1
                     return True
                 # Eliminar enlace existente incorrecto
                 if not self.dry_run:
-                    ruta_completa.unlink()
+                    os.unlink(ruta_completa)
             
             # Crear el enlace
             if self.dry_run:
-                self.log_debug(f"SIMULACIÓN: ln -sfn '{destino}' '{ruta_completa}'")
+                self.log_debug("SIMULACIÓN: ln -sfn '%s' '%s'", destino, ruta_completa)
                 self.enlaces_creados += 1
             else:
-                os.symlink(destino, str(ruta_completa))
-                self.log_debug(f"Creado enlace: {ruta_enlace} -> {destino}")
+                os.symlink(destino, ruta_completa)
+                self.log_debug("Creado enlace: %s -> %s", ruta_enlace, destino)
                 self.enlaces_creados += 1
             
             return True
@@ -1479,7 +1819,7 @@ class SyncBidireccional:
                         try:
                             if not self.dry_run:
                                 archivo.chmod(archivo.stat().st_mode | 0o111)
-                            self.log_debug(f"Permisos de ejecución añadidos: {archivo}")
+                            self.log_debug("Permisos de ejecución añadidos: %s", archivo)
                         except Exception as e:
                             self.log_error(f"Error añadiendo permisos a {archivo}: {e}")
                             exit_code = 1
@@ -1490,7 +1830,7 @@ class SyncBidireccional:
                     try:
                         if not self.dry_run:
                             archivo.chmod(archivo.stat().st_mode | 0o111)
-                        self.log_debug(f"Permisos de ejecución añadidos: {archivo}")
+                        self.log_debug("Permisos de ejecución añadidos: %s", archivo)
                     except Exception as e:
                         self.log_error(f"Error añadiendo permisos a {archivo}: {e}")
                         exit_code = 1
@@ -1530,7 +1870,7 @@ class SyncBidireccional:
             return
         
         try:
-            sistema = platform.system()
+            sistema = SISTEMA
             
             if sistema == "Linux":
                 # Para Linux (GNOME, KDE, etc.) usando notify-send
@@ -1610,8 +1950,8 @@ class SyncBidireccional:
         self.delete = True
         opts_delete = self.construir_opciones_rsync()
         
-        if (len(opts_base) != len(opts_overwrite) and 
-            len(opts_base) != len(opts_delete)):
+        if (opts_base != opts_overwrite and 
+            opts_base != opts_delete):
             tests_pasados += 1
             print("PASS: construir_opciones_rsync")
         else:
@@ -34,26 +34,76 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Optional, Any, Set
 import tomli
-import tomli_w
-import json
-from dataclasses import dataclass, field
-from enum import Enum
+from dataclasses import dataclass, field, fields, replace
+from enum import IntEnum
 import shutil
-import psutil
+import fnmatch
+import functools
+from collections import Counter
+import re
+import queue
+import atexit
+import errno
+import fcntl
+import struct
+import pickle
+import secrets
+import socket
+import ctypes
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+try:
+    import hyperscan
+except ImportError:
+    # Opcional: sin hyperscan las exclusiones se evalúan con re
+    hyperscan = None
+
+try:
+    import jeepney
+    import jeepney.io.blocking
+except ImportError:
+    # Opcional: sin jeepney las notificaciones se envían con notify-send
+    jeepney = None
+
+# Datos del sistema (constantes durante toda la ejecución)
+_HOSTNAME = platform.node()
+_SYSTEM = platform.system()
+_IS_LINUX = _SYSTEM == "Linux"
+
+@functools.lru_cache(maxsize=512)
+def normalizar_ruta(path: str) -> str:
+    """Expande '~' y resuelve la ruta (cacheado: resolve() hace lstat de cada componente)"""
+    return str(Path(path).expanduser().resolve())
 
 # =========================
 # Configuración de tipos de datos
 # =========================
 
-class SyncMode(Enum):
-    """Modos de sincronización disponibles"""
-    SUBIR = "subir"
-    BAJAR = "bajar"
+# Ubicaciones por defecto del archivo de configuración, por orden de preferencia
+DEFAULT_CONFIG_PATHS = (
+    "~/.config/syncb/config.toml",
+    "./syncb_config.toml",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "syncb_config.toml"),
+)
 
-class BackupDirMode(Enum):
+# Caché de la configuración ya parseada (cambiar la versión fuerza su invalidación)
+CONFIG_CACHE_FILE = "~/.cache/syncb/config.pkl"
+CONFIG_CACHE_VERSION = 1
+
+class SyncMode(IntEnum):
+    """Modos de sincronización disponibles (el valor indexa las tablas por modo)"""
+    SUBIR = 0
+    BAJAR = 1
+
+class BackupDirMode(IntEnum):
     """Modos de directorio de backup"""
-    COMUN = "comun"
-    READONLY = "readonly"
+    COMUN = 0
+    READONLY = 1
+
+# Descripción de la dirección de cada modo, indexada por SyncMode
+DIRECCION_MODO = ("LOCAL → PCLOUD (Subir)", "PCLOUD → LOCAL (Bajar)")
 
 @dataclass
 class SyncConfig:
@@ -82,7 +132,7 @@ class SyncConfig:
     
     # Lock
     lock_file: str = "/tmp/syncb.lock"
-    lock_timeout: int = 3600
+    lock_timeout: int = 3600  # Obsoleto: el kernel libera el lock al terminar el proceso
     
     # Hostnames
     hostname_rtva: str = "feynman.rtva.dnf"
@@ -98,19 +148,55 @@ class SyncConfig:
     permisos_archivos: Dict[str, str] = field(default_factory=dict)
     permisos_directorios: Dict[str, str] = field(default_factory=dict)
 
-@dataclass
-class SyncStats:
-    """Estadísticas de sincronización"""
-    elementos_procesados: int = 0
-    errores_sincronizacion: int = 0
-    archivos_transferidos: int = 0
-    enlaces_creados: int = 0
-    enlaces_existentes: int = 0
-    enlaces_errores: int = 0
-    enlaces_detectados: int = 0
-    archivos_borrados: int = 0
-    archivos_crypto_transferidos: int = 0
-    tiempo_inicio: float = field(default_factory=time.time)
+    # Rendimiento
+    transfers: int = 1
+    
+    def __post_init__(self):
+        self.expandir_rutas()
+    
+    def expandir_rutas(self):
+        """Expande una sola vez '~' en todos los campos de ruta"""
+        for f in fields(self):
+            valor = getattr(self, f.name)
+            if f.type in (str, 'str') and isinstance(valor, str) and valor.startswith('~'):
+                setattr(self, f.name, os.path.expanduser(valor))
+    
+    @property
+    def paths(self) -> Dict[str, Path]:
+        """Campos de ruta (ya expandidos) como objetos Path, en orden de declaración"""
+        return {
+            f.name: Path(getattr(self, f.name))
+            for f in fields(self)
+            if f.type in (str, 'str') and os.path.isabs(getattr(self, f.name))
+        }
+
+class SyncStats(ctypes.Structure):
+    """Estadísticas de sincronización (contadores contiguos, actualizables desde varios hilos)"""
+    _fields_ = [
+        ('elementos_procesados', ctypes.c_uint64),
+        ('errores_sincronizacion', ctypes.c_uint64),
+        ('archivos_transferidos', ctypes.c_uint64),
+        ('enlaces_creados', ctypes.c_uint64),
+        ('enlaces_existentes', ctypes.c_uint64),
+        ('enlaces_errores', ctypes.c_uint64),
+        ('enlaces_detectados', ctypes.c_uint64),
+        ('archivos_borrados', ctypes.c_uint64),
+        ('archivos_crypto_transferidos', ctypes.c_uint64),
+        ('tiempo_inicio', ctypes.c_double),
+    ]
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('tiempo_inicio', time.time())
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+    
+    def bump(self, name: str, n: int = 1):
+        """Incrementa un contador de forma segura entre hilos"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name, _ in self._fields_}
     
     @property
     def tiempo_total(self) -> float:
@@ -126,6 +212,13 @@ class Colors:
     CYAN = '\033[0;36m'
     WHITE = '\033[1;37m'
     NC = '\033[0m'  # No Color
+    
+    ESCAPES = re.compile(r'\x1b\[[0-9;]*m')
+    
+    @classmethod
+    def quitar(cls, texto: str) -> str:
+        """Elimina las secuencias de color del texto"""
+        return cls.ESCAPES.sub('', texto) if '\033' in texto else texto
 
 class Icons:
     """Iconos Unicode"""
@@ -141,6 +234,585 @@ class Icons:
     ERROR_ICON = "❌"
     SUCCESS_ICON = "✅"
 
+# =========================
+# Salida de consola
+# =========================
+
+class ConsoleSink:
+    """Salida de consola con un único hilo escritor que agrupa las escrituras.
+    
+    Las líneas se encolan junto con su stream de destino (stdout/stderr) y se escriben
+    en orden, en bloques de hasta MAX_BATCH bytes o cada FLUSH_INTERVAL segundos.
+    Tras close() (o si se crea síncrono) cada línea se escribe directamente.
+    """
+    
+    FLUSH_INTERVAL = 0.05
+    MAX_BATCH = 4096
+    
+    def __init__(self, sincrono: bool = False):
+        self.sincrono = sincrono
+        self.cola = queue.SimpleQueue()
+        self.con_color: Dict[Any, bool] = {}
+        self.hilo = None
+        if not sincrono:
+            self.hilo = threading.Thread(target=self._escritor, name='syncb-console', daemon=True)
+            self.hilo.start()
+    
+    def emit(self, linea: str = '', stream=None):
+        """Escribe una línea (se añade el salto de línea)"""
+        stream = stream or sys.stdout
+        if not self._admite_color(stream):
+            linea = Colors.quitar(linea)
+        if self.sincrono:
+            stream.write(f"{linea}\n")
+            stream.flush()
+        else:
+            self.cola.put((stream, f"{linea}\n"))
+    
+    def _admite_color(self, stream) -> bool:
+        """Indica si se emiten colores en el stream: solo a un terminal y sin NO_COLOR"""
+        admite = self.con_color.get(stream)
+        if admite is None:
+            try:
+                admite = stream.isatty() and not os.environ.get('NO_COLOR')
+            except (AttributeError, ValueError):
+                admite = False
+            self.con_color[stream] = admite
+        return admite
+    
+    def flush(self):
+        """Espera a que todo lo encolado se haya escrito"""
+        if self.sincrono:
+            return
+        escrito = threading.Event()
+        self.cola.put((None, escrito))
+        escrito.wait()
+    
+    def close(self):
+        """Vacía la cola, detiene el hilo y pasa a modo síncrono"""
+        if self.sincrono:
+            return
+        self.cola.put((None, None))
+        self.hilo.join()
+        self.sincrono = True
+    
+    def _escritor(self):
+        while True:
+            lote = [self.cola.get()]
+            tamano = len(lote[0][1] or '') if lote[0][0] else 0
+            limite = time.monotonic() + self.FLUSH_INTERVAL
+            while tamano < self.MAX_BATCH and lote[-1][0] is not None:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                lote.append(item)
+                if item[0] is not None:
+                    tamano += len(item[1])
+            
+            # Agrupar líneas consecutivas del mismo stream en una sola escritura
+            actual, partes = None, []
+            for stream, dato in lote:
+                if stream is not actual and partes:
+                    self._escribir(actual, partes)
+                    partes = []
+                if stream is None:
+                    if dato is None:
+                        return
+                    dato.set()
+                    actual = None
+                    continue
+                actual = stream
+                partes.append(dato)
+            if partes:
+                self._escribir(actual, partes)
+    
+    @staticmethod
+    def _escribir(stream, partes: List[str]):
+        texto = ''.join(partes)
+        try:
+            buffer = getattr(stream, 'buffer', None)
+            if buffer is None:
+                stream.write(texto)
+                stream.flush()
+                return
+            # Una única escritura de bytes, sin pasar por la capa de texto
+            stream.flush()
+            buffer.write(texto.encode(stream.encoding or 'utf-8', errors='replace'))
+            buffer.flush()
+        except (OSError, ValueError):
+            pass
+
+# =========================
+# Filtro de exclusiones
+# =========================
+
+class ExclusionMatcher:
+    """Patrones de exclusión compilados una sola vez para filtrar rutas en proceso.
+    
+    Sigue las reglas de --exclude de rsync sobre la ruta relativa al origen: un
+    patrón sin '/' se compara con el último componente, uno con '/' con los
+    últimos componentes de la ruta, uno que empieza por '/' queda anclado al
+    origen y uno que termina en '/' solo excluye directorios. '*' no cruza '/',
+    '**' sí. Los nombres literales se comprueban en un frozenset; el resto se
+    compila en una base de datos hyperscan (o en expresiones regulares si no
+    está disponible).
+    """
+    
+    GLOB_CHARS = frozenset('*?[')
+    
+    def __init__(self, patrones: List[str]):
+        literales, literales_dirs = set(), set()
+        regexes, solo_dirs = [], []
+        for patron in patrones:
+            solo_dir = patron.endswith('/')
+            patron = patron.strip().rstrip('/')
+            if not patron:
+                continue
+            if '/' not in patron and not self.GLOB_CHARS & set(patron):
+                (literales_dirs if solo_dir else literales).add(patron)
+            elif patron.startswith('/'):
+                regexes.append('^' + self._traducir(patron.lstrip('/')) + '$')
+                solo_dirs.append(solo_dir)
+            else:
+                regexes.append('(?:^|/)' + self._traducir(patron) + '$')
+                solo_dirs.append(solo_dir)
+        self.literales = frozenset(literales)
+        self.literales_dirs = frozenset(literales_dirs)
+        self.solo_dirs = frozenset(i for i, d in enumerate(solo_dirs) if d)
+        self.db = None
+        self.regex = None
+        self.regex_dirs = None
+        
+        if not regexes:
+            return
+        if hyperscan is not None:
+            try:
+                self.db = hyperscan.Database()
+                self.db.compile(
+                    expressions=[r.encode() for r in regexes],
+                    ids=list(range(len(regexes))),
+                    elements=len(regexes),
+                    flags=[hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_DOTALL] * len(regexes),
+                )
+                return
+            except hyperscan.error:
+                # Sintaxis no soportada por hyperscan
+                self.db = None
+        generales = [r for i, r in enumerate(regexes) if i not in self.solo_dirs]
+        directorios = [r for i, r in enumerate(regexes) if i in self.solo_dirs]
+        if generales:
+            self.regex = re.compile('|'.join(f"(?:{r})" for r in generales), re.DOTALL)
+        if directorios:
+            self.regex_dirs = re.compile('|'.join(f"(?:{r})" for r in directorios), re.DOTALL)
+    
+    @staticmethod
+    def _traducir(patron: str) -> str:
+        """Traduce un patrón de rsync a expresión regular ('*' no cruza '/', '**' sí)"""
+        partes = []
+        i, n = 0, len(patron)
+        while i < n:
+            c = patron[i]
+            i += 1
+            if c == '*':
+                if i < n and patron[i] == '*':
+                    partes.append('.*')
+                    i += 1
+                else:
+                    partes.append('[^/]*')
+            elif c == '?':
+                partes.append('[^/]')
+            elif c == '[':
+                # Un ']' justo tras '[' o '[!' forma parte de la clase
+                j = i + 1 if i < n and patron[i] in '!^' else i
+                j = patron.find(']', j + 1 if j < n and patron[j] == ']' else j)
+                if j < 0:
+                    partes.append(re.escape(c))
+                    continue
+                clase = patron[i:j].replace('\\', '\\\\')
+                if clase[0] in '!^':
+                    clase = '^' + clase[1:]
+                partes.append(f'[{clase}]')
+                i = j + 1
+            else:
+                partes.append(re.escape(c))
+        return ''.join(partes)
+    
+    def __call__(self, ruta: str, es_dir: bool = False) -> bool:
+        """Indica si la ruta (relativa al origen) coincide con alguna exclusión"""
+        nombre = ruta.rpartition('/')[2]
+        if nombre in self.literales or (es_dir and nombre in self.literales_dirs):
+            return True
+        if self.db is not None:
+            coincide = []
+            
+            def on_match(id_, *_args):
+                if id_ in self.solo_dirs and not es_dir:
+                    return False  # Patrón solo para directorios: seguir buscando
+                coincide.append(True)
+                return True  # Detener el escaneo en la primera coincidencia
+            
+            try:
+                self.db.scan(ruta.encode(errors='surrogateescape'), match_event_handler=on_match)
+            except hyperscan.ScanTerminated:
+                pass
+            return bool(coincide)
+        if self.regex is not None and self.regex.search(ruta):
+            return True
+        return es_dir and self.regex_dirs is not None and self.regex_dirs.search(ruta) is not None
+
+# =========================
+# Utilidades del sistema de archivos
+# =========================
+
+def esta_montado(mount_point: str) -> bool:
+    """Indica si hay algo montado exactamente en mount_point (se detiene en la primera coincidencia)"""
+    # mountinfo escapa en octal los espacios, tabuladores, saltos de línea y barras invertidas
+    clave = os.fsencode(mount_point)
+    for c in b'\\ \t\n':
+        clave = clave.replace(bytes([c]), b'\\%03o' % c)
+    try:
+        with open('/proc/self/mountinfo', 'rb') as f:
+            return any(linea.split(b' ', 5)[4:5] == [clave] for linea in f)
+    except OSError:
+        return False
+
+@functools.lru_cache(maxsize=None)
+def buscar_ejecutable(nombre: str) -> Optional[str]:
+    """shutil.which memoizado: cada ejecutable se busca en el PATH una sola vez"""
+    return shutil.which(nombre)
+
+def ruta_contenido(path: Path) -> str:
+    """Ruta con '/' final para rsync: se copia el contenido, no el directorio.
+    
+    Path descarta la barra final (Path('a') / '' es 'a'), así que se añade a la cadena.
+    """
+    return os.path.join(str(path), '')
+
+def directorio_vacio(path: Path) -> bool:
+    """Indica si el directorio no existe o no tiene entradas"""
+    try:
+        with os.scandir(path) as it:
+            return next(it, None) is None
+    except FileNotFoundError:
+        return True
+
+def initial_sync_tar(src: Path, dst: Path, files_from: str,
+                     timeout: Optional[int] = None) -> Tuple[int, int, bytes]:
+    """Copia src en dst con un único flujo tar | tar (sin compresión).
+    
+    Solo se empaquetan las rutas de files_from (lista NUL de build_files_from),
+    de modo que las exclusiones son las mismas que las de rsync. Devuelve
+    (código de salida, número de archivos extraídos, stderr).
+    """
+    dst.mkdir(parents=True, exist_ok=True)
+    producer_cmd = ['tar', '-cf', '-', '-C', str(src),
+                    '--null', '--no-recursion', '-T', files_from]
+    
+    # El stderr del productor va a un temporal: una tubería sin leer podría
+    # llenarse y bloquearlo mientras esperamos al consumidor
+    with tempfile.TemporaryFile() as err_productor:
+        producer = subprocess.Popen(producer_cmd, stdout=subprocess.PIPE, stderr=err_productor)
+        consumer = subprocess.Popen(
+            ['tar', '-xpvf', '-', '-C', str(dst)],
+            stdin=producer.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        # Cerrar nuestra copia para que el productor reciba EPIPE si el consumidor termina
+        producer.stdout.close()
+        
+        try:
+            salida, err_consumidor = consumer.communicate(timeout=timeout)
+            producer.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            consumer.kill()
+            producer.kill()
+            consumer.wait()
+            producer.wait()
+            raise
+        
+        err_productor.seek(0)
+        stderr = err_productor.read() + err_consumidor
+    
+    archivos = sum(1 for linea in salida.splitlines() if linea and not linea.endswith(b'/'))
+    return (producer.returncode or consumer.returncode), archivos, stderr
+
+def iter_symlinks(root: str, onerror=None):
+    """Recorre root con os.scandir y genera (ruta, destino) por cada enlace simbólico.
+    
+    Usa el tipo cacheado de cada DirEntry (d_type de readdir), sin lstat extra por
+    entrada. No sigue enlaces a directorios. Los errores se pasan a onerror si se da.
+    """
+    try:
+        stack = [os.scandir(root)]
+    except OSError as e:
+        if onerror is not None:
+            onerror(e)
+        return
+    
+    try:
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop().close()
+                continue
+            try:
+                if entry.is_symlink():
+                    yield entry.path, os.readlink(entry.path)
+                elif entry.is_dir(follow_symlinks=False):
+                    stack.append(os.scandir(entry.path))
+            except OSError as e:
+                if onerror is not None:
+                    onerror(e)
+    finally:
+        for it in stack:
+            it.close()
+
+def _compilar_componente(componente: str):
+    """Compila un componente de patrón glob a una función nombre -> bool"""
+    # Nombre literal o '*sufijo': comparación de cadenas; el resto, regex compilada
+    if not any(c in componente for c in '*?['):
+        return componente.__eq__
+    sufijo = componente[1:]
+    if componente[0] == '*' and not any(c in sufijo for c in '*?['):
+        return lambda nombre: nombre.endswith(sufijo)
+    return re.compile(fnmatch.translate(componente)).match
+
+def compilar_reglas_permisos(reglas: List[Tuple[str, Optional[int], bool]]) -> List[tuple]:
+    """Compila reglas (patrón, modo, anclada) para iter_cambios_permisos.
+    
+    Componentes del último al primero y reglas en orden inverso: la primera
+    coincidencia es la que ganaría (la última de la configuración). Una regla
+    anclada es una ruta concreta relativa a la raíz, comparada literalmente.
+    """
+    compiladas = []
+    for patron, modo, anclada in reversed(reglas):
+        componentes = reversed(patron.strip('/').split('/'))
+        if anclada:
+            compiladas.append((tuple(c.__eq__ for c in componentes), modo, True))
+        else:
+            compiladas.append((tuple(_compilar_componente(c) for c in componentes), modo, False))
+    return compiladas
+
+def iter_cambios_permisos(root: str, archivos: List[tuple],
+                          directorios: List[tuple], onerror=None):
+    """Recorre root una sola vez y genera (ruta, modo, dir_fd, nombre) donde el modo difiere.
+    
+    Las reglas vienen de compilar_reglas_permisos, con la semántica de Path.rglob: el
+    patrón se compara con los últimos componentes de la ruta relativa (las ancladas, con
+    la ruta completa). Si varias reglas coinciden gana la última; si la ganadora no tiene
+    modo (None) no se genera cambio. Usa el stat cacheado de cada DirEntry y no sigue
+    enlaces simbólicos. Un directorio se genera antes de entrar en él, de modo que un
+    directorio que no se puede abrir (p. ej. modo 000) se corrige y después se recorre.
+    Como os.fwalk, recorre por descriptores: dir_fd (abierto mientras se consume el
+    elemento) permite aplicar el cambio con os.chmod(nombre, modo, dir_fd=dir_fd) sin
+    volver a resolver la ruta completa.
+    """
+    def modo_deseado(partes: Tuple[str, ...], reglas) -> Optional[int]:
+        for componentes, modo, anclada in reglas:
+            if len(partes) < len(componentes) or (anclada and len(partes) != len(componentes)):
+                continue
+            if all(coincide(nombre) for coincide, nombre in zip(componentes, reversed(partes))):
+                return modo
+        return None
+    
+    def abrir(nombre: str, dir_fd: Optional[int] = None):
+        fd = os.open(nombre, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=dir_fd)
+        try:
+            return fd, os.scandir(fd)
+        except OSError:
+            os.close(fd)
+            raise
+    
+    try:
+        stack = [(*abrir(root), root, ())]
+    except OSError as e:
+        if onerror is not None:
+            onerror(e)
+        return
+    
+    try:
+        while stack:
+            fd, it, ruta_padre, partes_padre = stack[-1]
+            entry = next(it, None)
+            if entry is None:
+                stack.pop()
+                it.close()
+                os.close(fd)
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+                partes = partes_padre + (entry.name,)
+                ruta = os.path.join(ruta_padre, entry.name)
+                es_directorio = stat.S_ISDIR(st.st_mode)
+                if es_directorio:
+                    deseado = modo_deseado(partes, directorios)
+                elif stat.S_ISREG(st.st_mode):
+                    deseado = modo_deseado(partes, archivos)
+                else:
+                    continue
+                if deseado is not None and stat.S_IMODE(st.st_mode) != deseado:
+                    yield ruta, deseado, fd, entry.name
+                # Se entra en el directorio después de corregir su modo
+                if es_directorio:
+                    stack.append((*abrir(entry.name, fd), ruta, partes))
+            except OSError as e:
+                if onerror is not None:
+                    onerror(e)
+    finally:
+        for fd, it, _, _ in stack:
+            it.close()
+            os.close(fd)
+
+def read_symlinks_meta(path) -> List[Tuple[str, str]]:
+    """Lee el archivo de metadatos de enlaces (ruta<TAB>destino por línea).
+    
+    Se lee y decodifica de una vez: una sola lectura sin buffer intermedio (también
+    en montajes FUSE que no admiten mmap) y la decodificación UTF-8 en bloque.
+    """
+    with open(path, 'rb', buffering=0) as f:
+        datos = f.read()
+    
+    entradas = []
+    # split('\n') y no splitlines(): los nombres pueden contener otros separadores Unicode
+    for linea in datos.decode('utf-8').split('\n'):
+        ruta, sep, destino = linea.strip().partition('\t')
+        if sep and ruta:
+            entradas.append((ruta, destino))
+    return entradas
+
+def build_files_from(src: Path, excluido: ExclusionMatcher,
+                     enlaces: Optional[List[str]] = None) -> str:
+    """Enumera src con os.scandir y escribe sus rutas relativas para rsync --files-from.
+    
+    Las rutas se separan con NUL (rsync --from0). Se listan directorios y archivos
+    regulares, sin seguir enlaces, podando las exclusiones. Si se pasa enlaces, se
+    añaden a esa lista las rutas relativas de los enlaces simbólicos encontrados.
+    Devuelve la ruta del archivo temporal, que debe borrar el llamador.
+    """
+    with tempfile.NamedTemporaryFile(mode='wb', delete=False, prefix='syncb_files_') as f:
+        stack = []
+        try:
+            stack.append((os.scandir(src), ''))
+            while stack:
+                it, prefijo = stack[-1]
+                entry = next(it, None)
+                if entry is None:
+                    stack.pop()[0].close()
+                    continue
+                rel = prefijo + entry.name
+                es_dir = entry.is_dir(follow_symlinks=False)
+                if excluido(rel, es_dir):
+                    continue
+                if es_dir:
+                    f.write(os.fsencode(rel) + b'\0')
+                    stack.append((os.scandir(entry.path), rel + '/'))
+                elif entry.is_file(follow_symlinks=False):
+                    f.write(os.fsencode(rel) + b'\0')
+                elif enlaces is not None and entry.is_symlink():
+                    enlaces.append(rel)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+        finally:
+            for it, _ in stack:
+                it.close()
+    return f.name
+
+# =========================
+# Demonio rsync local
+# =========================
+
+class RsyncDaemon:
+    """rsync --daemon en 127.0.0.1 que sirve en solo lectura los orígenes de Crypto.
+    
+    Se arranca una vez por ejecución; cada sincronización se conecta con rsync://
+    en lugar de lanzar un rsync local completo. Los módulos exigen usuario y
+    contraseña aleatoria (archivo de secretos 0600 en un directorio 0700).
+    """
+    
+    USUARIO = "syncb"
+    ARRANQUE_TIMEOUT = 5.0
+    
+    def __init__(self, modulos: Dict[str, Path]):
+        self.modulos = modulos
+        self.password = secrets.token_hex(16)
+        self.directorio: Optional[str] = None
+        self.proceso: Optional[subprocess.Popen] = None
+        self.puerto = 0
+    
+    def start(self):
+        """Arranca el demonio y espera a que acepte conexiones"""
+        self.directorio = tempfile.mkdtemp(prefix='syncb_rsyncd_')
+        secretos = os.path.join(self.directorio, 'rsyncd.secrets')
+        fd = os.open(secretos, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{self.USUARIO}:{self.password}\n")
+        
+        lineas = [
+            "use chroot = no",
+            f"uid = {os.geteuid()}",
+            f"gid = {os.getegid()}",
+            f"log file = {os.path.join(self.directorio, 'rsyncd.log')}",
+        ]
+        for nombre, ruta in self.modulos.items():
+            lineas += [
+                f"[{nombre}]",
+                f"    path = {ruta}",
+                "    read only = yes",
+                f"    auth users = {self.USUARIO}",
+                f"    secrets file = {secretos}",
+            ]
+        config = os.path.join(self.directorio, 'rsyncd.conf')
+        with open(config, 'w') as f:
+            f.write('\n'.join(lineas) + '\n')
+        
+        # Puerto libre asignado por el kernel
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.puerto = sock.getsockname()[1]
+        
+        self.proceso = subprocess.Popen(
+            ['rsync', '--daemon', '--no-detach', f'--config={config}',
+             '--address=127.0.0.1', f'--port={self.puerto}'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        limite = time.monotonic() + self.ARRANQUE_TIMEOUT
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                raise RuntimeError(f"rsync --daemon terminó con código {self.proceso.returncode}")
+            try:
+                with socket.create_connection(('127.0.0.1', self.puerto), timeout=0.1):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("rsync --daemon no aceptó conexiones a tiempo")
+    
+    def url(self, modulo: str) -> str:
+        """URL rsync:// del módulo (con barra final: se copia el contenido)"""
+        return f"rsync://{self.USUARIO}@127.0.0.1:{self.puerto}/{modulo}/"
+    
+    def env(self) -> Dict[str, str]:
+        """Entorno para el cliente rsync con la contraseña del demonio"""
+        return dict(os.environ, RSYNC_PASSWORD=self.password)
+    
+    def stop(self):
+        """Detiene el demonio y borra su configuración"""
+        if self.proceso is not None:
+            self.proceso.terminate()
+            try:
+                self.proceso.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proceso.kill()
+                self.proceso.wait()
+            self.proceso = None
+        if self.directorio is not None:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+            self.directorio = None
+
 # =========================
 # Clase principal de sincronización
 # =========================
@@ -148,115 +820,195 @@ class Icons:
 class SyncB:
     """Clase principal para sincronización bidireccional con pCloud"""
     
+    # Validez de la comprobación de montaje de pCloud (segundos)
+    MOUNT_CHECK_TTL = 30.0
+    # Códigos de rsync que indican errores de E/S (invalidan la caché de montaje)
+    RSYNC_IO_ERROR_CODES = (23, 24)
+    # Líneas de --itemize-changes que se contabilizan, por sus dos primeros bytes:
+    # '>f+' archivo nuevo, '>f' resto de archivos recibidos, '<f' enviados
+    _RSYNC_TIPOS_LINEA = {b'>f': b'>f', b'<f': b'<f', b'*d': b'*deleting'}
+    # Campos de SyncConfig que se leen de cada sección del TOML
+    _CAMPOS_CONFIG = {
+        'general': ('pcloud_mount_point', 'local_dir', 'pcloud_backup_comun',
+                    'pcloud_backup_readonly', 'transfers'),
+        'crypto': ('local_crypto_dir', 'remote_crypto_dir', 'cloud_mount_check_file',
+                   'local_keepass_dir', 'remote_keepass_dir',
+                   'local_crypto_hostname_rtva_dir', 'remote_crypto_hostname_rtva_dir'),
+        'files': ('log_file', 'lista_por_defecto_file', 'lista_especifica_por_defecto_file',
+                  'exclusiones_file', 'symlinks_file'),
+        'lock': ('lock_file', 'lock_timeout'),
+    }
+    
     def __init__(self, config_path: Optional[str] = None):
         """Inicializa la clase de sincronización"""
         self.config = SyncConfig()
         self.stats = SyncStats()
+        self.console = ConsoleSink()
+        atexit.register(self.console.close)
         self.args = None
+        self.modo = SyncMode.SUBIR
         self.logger = None
         self.lock_acquired = False
+        self.lock_fd: Optional[int] = None
+        self._mount_ok_until: float = 0.0
+        self._statvfs_pcloud: Optional[os.statvfs_result] = None
         self.temp_files: Set[str] = set()
+        self.exclusion_matcher: Optional[ExclusionMatcher] = None
+        self.reglas_permisos: Optional[tuple] = None
+        self._rsync_opts_cache: Optional[Tuple[str, ...]] = None
+        self.rsync_simultaneos = 1
+        self.rsync_daemon: Optional[RsyncDaemon] = None
+        self.rsync_daemon_fallido = False
+        # Constantes del proceso usadas por cada línea del archivo de enlaces
+        self._usuario = os.getenv('USER', 'user')
+        self._home = str(Path.home())
+        self._local_dir_str = ''
+        self._local_dir_prefijo = ''
+        # Protege recursos compartidos entre hilos de sincronización
+        self._lock = threading.Lock()
         
         # Cargar configuración
         self._load_config(config_path)
         
-        # Configurar logging
-        self._setup_logging()
-        
         # Inicializar rutas
         self._init_paths()
         
+        # Configurar logging
+        self._setup_logging()
+        
         # Configurar manejo de señales
         self._setup_signal_handlers()
     
     def _load_config(self, config_path: Optional[str] = None):
         """Carga la configuración desde archivo TOML"""
-        possible_paths = [
-            config_path,
-            "~/.config/syncb/config.toml",
-            "./syncb_config.toml",
-            Path(__file__).parent / "syncb_config.toml"
-        ]
-        
+        # Un único stat por candidato; se reutiliza para la clave de la caché
         config_file = None
-        for path in possible_paths:
-            if path and Path(path).expanduser().exists():
-                config_file = Path(path).expanduser()
-                break
+        for path in (config_path, *DEFAULT_CONFIG_PATHS):
+            if not path:
+                continue
+            path = os.path.expanduser(path)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            config_file = path
+            break
         
         if not config_file:
             raise FileNotFoundError("No se encontró archivo de configuración")
         
+        # Reutilizar la configuración cacheada si el TOML no ha cambiado
+        # (también se invalida al actualizar este script, por si cambia SyncConfig)
+        st_script = os.stat(__file__)
+        clave = (CONFIG_CACHE_VERSION, os.path.abspath(config_file), st.st_mtime_ns, st.st_size,
+                 st_script.st_mtime_ns, st_script.st_size)
+        config = self._leer_cache_config(clave)
+        if config is not None:
+            self.config = config
+            return
+        
         with open(config_file, 'rb') as f:
             config_data = tomli.load(f)
         
-        # Mapear configuración
-        general = config_data.get('general', {})
-        self.config.pcloud_mount_point = general.get('pcloud_mount_point', self.config.pcloud_mount_point)
-        self.config.local_dir = general.get('local_dir', self.config.local_dir)
-        self.config.pcloud_backup_comun = general.get('pcloud_backup_comun', self.config.pcloud_backup_comun)
-        self.config.pcloud_backup_readonly = general.get('pcloud_backup_readonly', self.config.pcloud_backup_readonly)
-        
-        crypto = config_data.get('crypto', {})
-        self.config.local_crypto_dir = crypto.get('local_crypto_dir', self.config.local_crypto_dir)
-        self.config.remote_crypto_dir = crypto.get('remote_crypto_dir', self.config.remote_crypto_dir)
-        self.config.cloud_mount_check_file = crypto.get('cloud_mount_check_file', self.config.cloud_mount_check_file)
-        self.config.local_keepass_dir = crypto.get('local_keepass_dir', self.config.local_keepass_dir)
-        self.config.remote_keepass_dir = crypto.get('remote_keepass_dir', self.config.remote_keepass_dir)
-        self.config.local_crypto_hostname_rtva_dir = crypto.get('local_crypto_hostname_rtva_dir', self.config.local_crypto_hostname_rtva_dir)
-        self.config.remote_crypto_hostname_rtva_dir = crypto.get('remote_crypto_hostname_rtva_dir', self.config.remote_crypto_hostname_rtva_dir)
-        
-        files = config_data.get('files', {})
-        self.config.log_file = files.get('log_file', self.config.log_file)
-        self.config.lista_por_defecto_file = files.get('lista_por_defecto_file', self.config.lista_por_defecto_file)
-        self.config.lista_especifica_por_defecto_file = files.get('lista_especifica_por_defecto_file', self.config.lista_especifica_por_defecto_file)
-        self.config.exclusiones_file = files.get('exclusiones_file', self.config.exclusiones_file)
-        self.config.symlinks_file = files.get('symlinks_file', self.config.symlinks_file)
-        
-        lock = config_data.get('lock', {})
-        self.config.lock_file = lock.get('lock_file', self.config.lock_file)
-        self.config.lock_timeout = lock.get('lock_timeout', self.config.lock_timeout)
-        
-        hosts = config_data.get('hosts', {})
-        self.config.hosts = hosts
-        
-        # Cargar listas de sincronización
-        self.config.directorios = config_data.get('directorios', {})
-        self.config.exclusiones = config_data.get('exclusiones', [])
-        
-        # Cargar permisos
+        # Mapear configuración: solo se sobrescriben las claves presentes
+        valores = {}
+        for seccion, campos in self._CAMPOS_CONFIG.items():
+            datos = config_data.get(seccion, {})
+            valores.update((campo, datos[campo]) for campo in campos if campo in datos)
+        
+        # Listas de sincronización, hosts y permisos
         permisos = config_data.get('permisos', {})
-        self.config.permisos_archivos = permisos.get('archivos', {})
-        self.config.permisos_directorios = permisos.get('directorios', {})
+        self.config = replace(
+            self.config,
+            hosts=config_data.get('hosts', {}),
+            directorios=config_data.get('directorios', {}),
+            exclusiones=config_data.get('exclusiones', []),
+            permisos_archivos=permisos.get('archivos', {}),
+            permisos_directorios=permisos.get('directorios', {}),
+            **valores
+        )
+        
+        self._guardar_cache_config(clave)
+    
+    @staticmethod
+    def _leer_cache_config(clave: tuple) -> Optional[SyncConfig]:
+        """Devuelve la configuración cacheada si su clave coincide"""
+        try:
+            with open(os.path.expanduser(CONFIG_CACHE_FILE), 'rb') as f:
+                clave_cache, config = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+            return None
+        if clave_cache != clave or not isinstance(config, SyncConfig):
+            return None
+        return config
+    
+    def _guardar_cache_config(self, clave: tuple):
+        """Guarda la configuración parseada (escritura atómica; los fallos se ignoran)"""
+        cache_file = Path(CONFIG_CACHE_FILE).expanduser()
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=cache_file.parent, delete=False) as f:
+                pickle.dump((clave, self.config), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, cache_file)
+        except OSError:
+            pass
     
     def _setup_logging(self):
         """Configura el sistema de logging"""
-        log_file = Path(self.config.log_file).expanduser()
+        log_file = Path(self.config.log_file)
         log_file.parent.mkdir(parents=True, exist_ok=True)
         
         # Configurar formato
-        formatter = logging.Formatter(
+        formatter = self._PlainFormatter(
             '%(asctime)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
         # Configurar handler de archivo con rotación
-        file_handler = logging.FileHandler(log_file)
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8'
+        )
         file_handler.setFormatter(formatter)
         
-        # Configurar handler de consola con colores
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(self._ColoredFormatter())
+        # El archivo se escribe desde un hilo en segundo plano (cada registro se vuelca al
+        # escribirlo, así que el log está completo aunque el proceso muera de golpe)
+        log_queue = queue.Queue(-1)
+        self.log_listener = QueueListener(log_queue, file_handler)
+        self.log_listener.start()
+        atexit.register(self.log_listener.stop)
+        
+        # Configurar handler de consola con colores (mismo escritor que el resto de la salida)
+        console_handler = self._ConsoleHandler(self.console)
+        console_handler.setFormatter(self._ColoredFormatter('%(levelname_colored)s %(message)s'))
         
         # Configurar logger
         self.logger = logging.getLogger('syncb')
         self.logger.setLevel(logging.DEBUG)
-        self.logger.addHandler(file_handler)
+        self.logger.addHandler(QueueHandler(log_queue))
         self.logger.addHandler(console_handler)
         
         # Deshabilitar propagación para evitar duplicados
         self.logger.propagate = False
     
+    class _ConsoleHandler(logging.StreamHandler):
+        """StreamHandler (stderr) que escribe a través del ConsoleSink"""
+        
+        def __init__(self, sink: 'ConsoleSink'):
+            super().__init__()
+            self.sink = sink
+        
+        def emit(self, record):
+            try:
+                self.sink.emit(self.format(record), self.stream)
+            except Exception:
+                self.handleError(record)
+    
+    class _PlainFormatter(logging.Formatter):
+        """Formateador sin secuencias de color para el archivo de log"""
+        
+        def format(self, record):
+            return Colors.quitar(super().format(record))
+    
     class _ColoredFormatter(logging.Formatter):
         """Formateador con colores para la consola"""
         
@@ -276,26 +1028,24 @@ class SyncB:
             'CRITICAL': Icons.ERROR_ICON
         }
         
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # Prefijo de cada nivel precalculado una sola vez
+            self.prefijos = {
+                nivel: f"{color}{self.ICONS[nivel]} [{nivel}]{Colors.NC}"
+                for nivel, color in self.COLORS.items()
+            }
+        
         def format(self, record):
-            color = self.COLORS.get(record.levelname, Colors.NC)
-            icon = self.ICONS.get(record.levelname, '')
-            record.levelname = f"{color}{icon} [{record.levelname}]{Colors.NC}"
+            # Atributo aparte: levelname queda intacto para el resto de handlers
+            record.levelname_colored = self.prefijos.get(record.levelname, record.levelname)
             return super().format(record)
     
     def _init_paths(self):
         """Inicializa y expande todas las rutas"""
-        self.config.pcloud_mount_point = str(Path(self.config.pcloud_mount_point).expanduser())
-        self.config.local_dir = str(Path(self.config.local_dir).expanduser())
-        self.config.pcloud_backup_comun = str(Path(self.config.pcloud_backup_comun).expanduser())
-        self.config.pcloud_backup_readonly = str(Path(self.config.pcloud_backup_readonly).expanduser())
-        self.config.local_crypto_dir = str(Path(self.config.local_crypto_dir).expanduser())
-        self.config.remote_crypto_dir = str(Path(self.config.remote_crypto_dir).expanduser())
-        self.config.local_keepass_dir = str(Path(self.config.local_keepass_dir).expanduser())
-        self.config.remote_keepass_dir = str(Path(self.config.remote_keepass_dir).expanduser())
-        self.config.local_crypto_hostname_rtva_dir = str(Path(self.config.local_crypto_hostname_rtva_dir).expanduser())
-        self.config.remote_crypto_hostname_rtva_dir = str(Path(self.config.remote_crypto_hostname_rtva_dir).expanduser())
-        self.config.log_file = str(Path(self.config.log_file).expanduser())
-        self.config.lock_file = str(Path(self.config.lock_file).expanduser())
+        self.config.expandir_rutas()
+        self._local_dir_str = os.path.normpath(self.config.local_dir)
+        self._local_dir_prefijo = os.path.join(self._local_dir_str, '')
     
     def _setup_signal_handlers(self):
         """Configura el manejo de señales para limpieza"""
@@ -307,29 +1057,38 @@ class SyncB:
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
     
-    def parse_arguments(self):
-        """Parsea los argumentos de línea de comandos"""
-        parser = argparse.ArgumentParser(
-            description='Sincronización bidireccional entre directorio local y pCloud Drive',
-            formatter_class=argparse.RawDescriptionHelpFormatter,
-            epilog=f'''
+    class _ArgumentParser(argparse.ArgumentParser):
+        """ArgumentParser que solo compone los ejemplos de uso al mostrar la ayuda"""
+        
+        EJEMPLOS = '''
 Ejemplos de uso:
-  {sys.argv[0]} --subir
-  {sys.argv[0]} --bajar --dry-run
-  {sys.argv[0]} --subir --delete --yes
-  {sys.argv[0]} --subir --item documentos/
-  {sys.argv[0]} --bajar --item configuracion.ini --item .local/bin --dry-run
-  {sys.argv[0]} --bajar --backup-dir --item documentos/ --yes
-  {sys.argv[0]} --subir --exclude '*.tmp' --exclude 'temp/'
-  {sys.argv[0]} --subir --overwrite     # Sobrescribe todos los archivos
-  {sys.argv[0]} --subir --bwlimit 1000  # Sincronizar subiendo con límite de 1MB/s
-  {sys.argv[0]} --subir --verbose       # Sincronizar con output verboso
-  {sys.argv[0]} --bajar --item Documentos/ --timeout 10  # Timeout corto de 10 minutos
-  {sys.argv[0]} --force-unlock   # Forzar desbloqueo si hay un lock obsoleto
-  {sys.argv[0]} --crypto         # Incluir directorio Crypto de la sincronización
+  {prog} --subir
+  {prog} --bajar --dry-run
+  {prog} --subir --delete --yes
+  {prog} --subir --item documentos/
+  {prog} --bajar --item configuracion.ini --item .local/bin --dry-run
+  {prog} --bajar --backup-dir --item documentos/ --yes
+  {prog} --subir --exclude '*.tmp' --exclude 'temp/'
+  {prog} --subir --overwrite     # Sobrescribe todos los archivos
+  {prog} --subir --bwlimit 1000  # Sincronizar subiendo con límite de 1MB/s
+  {prog} --subir --verbose       # Sincronizar con output verboso
+  {prog} --bajar --item Documentos/ --timeout 10  # Timeout corto de 10 minutos
+  {prog} --force-unlock   # Comprobar quién tiene el lock (nunca lo borra)
+  {prog} --crypto         # Incluir directorio Crypto de la sincronización
 
-Hostname detectado: {platform.node()}
+Hostname detectado: {hostname}
             '''
+        
+        def format_help(self):
+            if self.epilog is None:
+                self.epilog = self.EJEMPLOS.format(prog=sys.argv[0], hostname=_HOSTNAME)
+            return super().format_help()
+    
+    def parse_arguments(self):
+        """Parsea los argumentos de línea de comandos"""
+        parser = self._ArgumentParser(
+            description='Sincronización bidireccional entre directorio local y pCloud Drive',
+            formatter_class=argparse.RawDescriptionHelpFormatter
         )
         
         # Opciones principales (mutuamente excluyentes)
@@ -360,14 +1119,25 @@ Hostname detectado: {platform.node()}
                           help='Limita la velocidad de transferencia (ej: 1000 para 1MB/s)')
         parser.add_argument('--timeout', type=int, default=30,
                           help='Límite de tiempo por operación en minutos (default: 30)')
+        parser.add_argument('--transfers', type=int,
+                          help='Número de elementos sincronizados en paralelo; --bwlimit se reparte entre ellos (default: config, 1)')
         parser.add_argument('--force-unlock', action='store_true',
-                          help='Forzar eliminación de lock')
+                          help='Muestra quién tiene el lock y limpia su información si está libre')
         parser.add_argument('--crypto', action='store_true',
                           help='Incluye la sincronización del directorio Crypto')
+        parser.add_argument('--rsync-daemon', action='store_true',
+                          help='Sincroniza Crypto a través de un demonio rsync local (experimental)')
+        parser.add_argument('--strict-precheck', action='store_true',
+                          help='Comprueba antes de sincronizar que se puede escribir en pCloud')
         parser.add_argument('--verbose', action='store_true',
                           help='Habilita modo verboso para debugging')
         
         self.args = parser.parse_args()
+        self.modo = SyncMode.SUBIR if self.args.subir else SyncMode.BAJAR
+        
+        # En modo verboso la consola se escribe de forma síncrona
+        if self.args.verbose:
+            self.console.close()
         
         # Validaciones adicionales
         if self.args.force_unlock:
@@ -375,13 +1145,38 @@ Hostname detectado: {platform.node()}
             sys.exit(0)
     
     def _force_unlock(self):
-        """Forza la eliminación del lock file"""
-        lock_file = Path(self.config.lock_file)
-        if lock_file.exists():
-            lock_file.unlink()
-            self.logger.info("Lock eliminado forzadamente")
-        else:
+        """Informa del dueño del lock sin borrar nunca el lock file.
+        
+        Borrar el archivo mientras otro proceso mantiene el bloqueo dejaría que una
+        nueva ejecución bloquease otro inodo y corriese en paralelo. El kernel libera
+        el bloqueo al morir su dueño, así que un lock obsoleto no existe: si el
+        bloqueo está libre solo se limpia la información que quedó escrita.
+        """
+        try:
+            fd = os.open(self.config.lock_file, os.O_RDWR)
+        except FileNotFoundError:
             self.logger.info("No hay lock activo")
+            return
+        except OSError as e:
+            self.logger.error(f"No se pudo abrir el archivo de lock: {e}")
+            return
+        
+        try:
+            try:
+                self._bloquear_lock(fd)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    self.logger.error(f"No se pudo comprobar el lock: {e}")
+                    return
+                lock_info = os.pread(fd, 256, 0).decode(errors='replace').split('\n')[0]
+                self.logger.warning(f"El lock está en uso por un proceso activo ({lock_info or 'desconocido'}); "
+                                    "no se elimina, se liberará cuando ese proceso termine")
+                return
+            # Bloqueo libre: solo queda información de una ejecución ya terminada
+            os.ftruncate(fd, 0)
+            self.logger.info("No hay lock activo (información obsoleta limpiada)")
+        finally:
+            os.close(fd)
     
     def get_pcloud_dir(self) -> str:
         """Obtiene el directorio de pCloud según el modo"""
@@ -391,98 +1186,69 @@ Hostname detectado: {platform.node()}
     
     def normalize_path(self, path: str) -> str:
         """Normaliza una ruta"""
-        return str(Path(path).expanduser().resolve())
+        return normalizar_ruta(str(path))
     
     def verificar_conectividad_pcloud(self) -> bool:
         """Verifica la conectividad con pCloud"""
         self.logger.debug("Verificando conectividad con pCloud...")
         
         try:
-            # Intentar conectar a pCloud
-            result = subprocess.run(
-                ['curl', '-s', '--connect-timeout', '5', 'https://www.pcloud.com/'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                self.logger.info("Verificación de conectividad pCloud: OK")
-                return True
-            else:
-                self.logger.warning("No se pudo conectar a pCloud")
-                return False
-                
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            self.logger.warning("curl no disponible o timeout, omitiendo verificación")
-            return True
+            # Basta con abrir una conexión TCP: sin lanzar curl ni negociar TLS
+            with socket.create_connection(('www.pcloud.com', 443), timeout=5):
+                pass
+        except OSError as e:
+            self.logger.warning(f"No se pudo conectar a pCloud ({e})")
+            return False
+        
+        self.logger.info("Verificación de conectividad pCloud: OK")
+        return True
     
     def verificar_pcloud_montado(self) -> bool:
         """Verifica si pCloud está montado correctamente"""
-        pcloud_dir = self.normalize_path(self.get_pcloud_dir())
         mount_point = self.normalize_path(self.config.pcloud_mount_point)
         
         self.logger.debug(f"Verificando montaje de pCloud en: {mount_point}")
         
-        # Verificar si el punto de montaje existe
-        if not Path(mount_point).exists():
-            self.logger.error(f"El punto de montaje de pCloud no existe: {mount_point}")
-            return False
-        
-        # Verificar si el directorio está vacío (puede indicar que no está montado)
+        # Un único statvfs: falla si el punto de montaje no existe o no es accesible
         try:
-            if not any(Path(mount_point).iterdir()):
-                self.logger.error(f"El directorio de pCloud está vacío: {mount_point}")
-                return False
-        except OSError:
-            self.logger.error(f"No se puede leer el directorio de pCloud: {mount_point}")
+            self._statvfs_pcloud = os.statvfs(mount_point)
+        except OSError as e:
+            self.logger.error(f"El punto de montaje de pCloud no existe o no es accesible: {mount_point} ({e})")
             return False
         
         # Verificar usando diferentes métodos según el SO
-        system = platform.system()
-        
-        if system == "Linux":
-            # En Linux usar mountpoint o /proc/mounts
-            try:
-                result = subprocess.run(
-                    ['mountpoint', '-q', mount_point],
-                    capture_output=True
-                )
-                if result.returncode != 0:
-                    self.logger.error(f"pCloud no aparece montado en {mount_point}")
-                    return False
-            except FileNotFoundError:
-                # Fallback: verificar en /proc/mounts
-                with open('/proc/mounts', 'r') as f:
-                    mounts = f.read()
-                if 'pcloud' not in mounts:
-                    self.logger.error("pCloud no aparece en /proc/mounts")
-                    return False
+        if _IS_LINUX:
+            # En Linux basta con /proc/self/mountinfo, sin caché: el montaje puede cambiar
+            if not esta_montado(mount_point):
+                self.logger.error(f"pCloud no aparece montado en {mount_point}")
+                return False
         
-        elif system == "Darwin":
-            # En macOS usar mount
+        else:
+            # Verificar si el directorio está vacío (puede indicar que no está montado)
             try:
-                result = subprocess.run(['mount'], capture_output=True, text=True)
-                if mount_point not in result.stdout:
-                    self.logger.error(f"pCloud no aparece montado en {mount_point}")
+                if directorio_vacio(mount_point):
+                    self.logger.error(f"El directorio de pCloud está vacío: {mount_point}")
                     return False
-            except FileNotFoundError:
-                self.logger.warning("No se pudo verificar montaje en macOS")
-        
-        # Verificación adicional con df
-        try:
-            subprocess.run(['df', mount_point], capture_output=True, check=True)
-        except subprocess.CalledProcessError:
-            self.logger.error(f"pCloud no está montado correctamente en {mount_point}")
-            return False
-        
-        # Verificar permisos de escritura (solo si no es dry-run y no es modo backup-dir)
-        if not self.args.dry_run and not self.args.backup_dir:
-            test_file = Path(pcloud_dir) / f".test_write_{os.getpid()}"
-            try:
-                test_file.touch()
-                test_file.unlink()
             except OSError:
+                self.logger.error(f"No se puede leer el directorio de pCloud: {mount_point}")
+                return False
+            
+            if _SYSTEM == "Darwin":
+                # En macOS usar mount
+                try:
+                    result = subprocess.run(['mount'], capture_output=True, text=True)
+                    # Coincidencia exacta del punto de montaje, no de cualquier subcadena
+                    if f" on {mount_point} (" not in result.stdout:
+                        self.logger.error(f"pCloud no aparece montado en {mount_point}")
+                        return False
+                except FileNotFoundError:
+                    self.logger.warning("No se pudo verificar montaje en macOS")
+        
+        # Verificar permisos de escritura solo si se pide: por defecto el primer fallo
+        # de escritura de rsync lo detecta sin otro viaje de ida y vuelta a FUSE
+        if self.args.strict_precheck and not self.args.dry_run and not self.args.backup_dir:
+            pcloud_dir = self.normalize_path(self.get_pcloud_dir())
+            if not os.access(pcloud_dir, os.W_OK):
                 self.logger.error(f"No se puede escribir en: {pcloud_dir}")
                 return False
         
@@ -493,160 +1259,197 @@ Hostname detectado: {platform.node()}
                 self.logger.error("El volumen Crypto no está montado o el archivo de verificación no existe")
                 return False
         
+        self._mount_ok_until = time.monotonic() + self.MOUNT_CHECK_TTL
         self.logger.info("Verificación de pCloud: OK - El directorio está montado y accesible")
         return True
     
+    def _mount_ok(self) -> bool:
+        """Comprobación ligera de montaje, cacheada durante MOUNT_CHECK_TTL segundos"""
+        now = time.monotonic()
+        if now < self._mount_ok_until:
+            return True
+        
+        ok = os.path.ismount(self.normalize_path(self.config.pcloud_mount_point))
+        if ok and self.args.crypto:
+            ok = os.path.isfile(os.path.join(self.config.remote_crypto_dir, self.config.cloud_mount_check_file))
+        
+        if ok:
+            self._mount_ok_until = now + self.MOUNT_CHECK_TTL
+        return ok
+    
+    @staticmethod
+    def _free_bytes(st: os.statvfs_result) -> int:
+        """Bytes disponibles para el usuario según un resultado de statvfs"""
+        return st.f_bavail * st.f_frsize
+    
     def verificar_espacio_disco(self, needed_mb: int = 100) -> bool:
         """Verifica el espacio disponible en disco"""
-        mount_point = (
-            self.normalize_path(self.config.pcloud_mount_point) 
-            if self.args.subir 
-            else self.normalize_path(self.config.local_dir)
-        )
-        
         tipo_operacion = "SUBIDA a pCloud" if self.args.subir else "BAJADA desde pCloud"
         
-        if not Path(mount_point).exists():
-            self.logger.warning(f"El punto de montaje {mount_point} no existe, omitiendo verificación")
-            return True
+        if self.args.subir and self._statvfs_pcloud is not None:
+            # Subida: se reutiliza el statvfs obtenido al verificar el montaje, sin más syscalls
+            mount_point = self.config.pcloud_mount_point
+            st = self._statvfs_pcloud
+        else:
+            mount_point = (
+                self.normalize_path(self.config.pcloud_mount_point)
+                if self.args.subir
+                else self.normalize_path(self.config.local_dir)
+            )
+            # Un único statvfs, que también detecta que la ruta no existe
+            try:
+                st = os.statvfs(mount_point)
+            except FileNotFoundError:
+                self.logger.warning(f"El punto de montaje {mount_point} no existe, omitiendo verificación")
+                return True
+            except OSError as e:
+                self.logger.warning(f"No se pudo verificar el espacio en disco: {e}")
+                return True
         
-        try:
-            disk_usage = shutil.disk_usage(mount_point)
-            available_mb = disk_usage.free // (1024 * 1024)
-            
-            if available_mb < needed_mb:
-                self.logger.error(
-                    f"Espacio insuficiente para {tipo_operacion} en {mount_point}\n"
-                    f"Disponible: {available_mb}MB, Necesario: {needed_mb}MB"
-                )
-                return False
-            
-            self.logger.info(
-                f"Espacio en disco verificado para {tipo_operacion}. "
-                f"Disponible: {available_mb}MB"
+        available_mb = self._free_bytes(st) // (1024 * 1024)
+        
+        if available_mb < needed_mb:
+            self.logger.error(
+                f"Espacio insuficiente para {tipo_operacion} en {mount_point}\n"
+                f"Disponible: {available_mb}MB, Necesario: {needed_mb}MB"
             )
-            return True
-            
-        except OSError as e:
-            self.logger.warning(f"No se pudo verificar el espacio en disco: {e}")
-            return True
+            return False
+        
+        self.logger.info(
+            f"Espacio en disco verificado para {tipo_operacion}. "
+            f"Disponible: {available_mb}MB"
+        )
+        return True
+    
+    @staticmethod
+    def _bloquear_lock(fd: int):
+        """Toma sin esperar el bloqueo de escritura del lock file (OSError si está ocupado)"""
+        if hasattr(fcntl, 'F_OFD_SETLK'):
+            fcntl.fcntl(fd, fcntl.F_OFD_SETLK, struct.pack('hhqqi', fcntl.F_WRLCK, 0, 0, 0, 0))
+        else:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
     
     def establecer_lock(self) -> bool:
-        """Establece el lock file para prevenir ejecuciones simultáneas"""
+        """Establece el lock para prevenir ejecuciones simultáneas.
+        
+        Usa un bloqueo de registro POSIX (OFD en Linux) sobre el lock file: el kernel
+        lo libera al morir el proceso, por lo que no hay locks obsoletos que limpiar.
+        """
         lock_file = Path(self.config.lock_file)
         
-        if lock_file.exists():
-            # Verificar si el lock es antiguo
+        try:
+            fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            self.logger.error(f"No se pudo crear el archivo de lock: {e}")
+            return False
+        
+        try:
+            self._bloquear_lock(fd)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                os.close(fd)
+                self.logger.error(f"No se pudo establecer el lock: {e}")
+                return False
+            # Leer información del proceso dueño del lock
             try:
-                lock_time = lock_file.stat().st_mtime
-                current_time = time.time()
-                lock_age = current_time - lock_time
-                
-                if lock_age > self.config.lock_timeout:
-                    self.logger.warning(f"Eliminando lock obsoleto (edad: {lock_age:.0f}s)")
-                    lock_file.unlink()
-                else:
-                    # Leer información del proceso dueño del lock
-                    try:
-                        with lock_file.open('r') as f:
-                            lock_info = f.read().split('\n')[0]
-                        self.logger.error(f"Ya hay una ejecución en progreso: {lock_info}")
-                    except:
-                        self.logger.error("Ya hay una ejecución en progreso (lock file existente)")
-                    return False
-                    
+                lock_info = os.pread(fd, 256, 0).decode(errors='replace').split('\n')[0]
             except OSError:
-                self.logger.warning("No se pudo verificar el lock, eliminando...")
-                lock_file.unlink()
+                lock_info = ""
+            os.close(fd)
+            if lock_info:
+                self.logger.error(f"Ya hay una ejecución en progreso: {lock_info}")
+            else:
+                self.logger.error("Ya hay una ejecución en progreso (lock file existente)")
+            return False
         
-        # Crear nuevo lock
+        # Escribir información del lock
+        info = (
+            f"PID: {os.getpid()}\n"
+            f"Fecha: {datetime.now()}\n"
+            f"Modo: {'subir' if self.args.subir else 'bajar'}\n"
+            f"Usuario: {os.getenv('USER', 'unknown')}\n"
+            f"Hostname: {_HOSTNAME}\n"
+        )
         try:
-            with lock_file.open('w') as f:
-                f.write(f"PID: {os.getpid()}\n")
-                f.write(f"Fecha: {datetime.now()}\n")
-                f.write(f"Modo: {'subir' if self.args.subir else 'bajar'}\n")
-                f.write(f"Usuario: {os.getenv('USER', 'unknown')}\n")
-                f.write(f"Hostname: {platform.node()}\n")
-            
-            self.lock_acquired = True
-            self.logger.info(f"Lock establecido: {lock_file}")
-            return True
-            
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, info.encode(), 0)
         except OSError as e:
-            self.logger.error(f"No se pudo crear el archivo de lock: {e}")
-            return False
+            self.logger.warning(f"No se pudo escribir la información del lock: {e}")
+        
+        # El lock vive mientras el descriptor siga abierto
+        self.lock_fd = fd
+        self.lock_acquired = True
+        self.logger.info(f"Lock establecido: {lock_file}")
+        return True
     
     def eliminar_lock(self):
-        """Elimina el lock file"""
-        if self.lock_acquired:
-            lock_file = Path(self.config.lock_file)
-            if lock_file.exists():
-                try:
-                    # Verificar que somos los dueños del lock
-                    with lock_file.open('r') as f:
-                        first_line = f.readline().strip()
-                    if f"PID: {os.getpid()}" in first_line:
-                        lock_file.unlink()
-                        self.logger.info("Lock eliminado")
-                        self.lock_acquired = False
-                except OSError:
-                    pass
+        """Libera el lock"""
+        if self.lock_acquired and self.lock_fd is not None:
+            try:
+                # No se borra el archivo: otro proceso podría tenerlo ya abierto
+                os.ftruncate(self.lock_fd, 0)
+            except OSError:
+                pass
+            os.close(self.lock_fd)
+            self.lock_fd = None
+            self.lock_acquired = False
+            self.logger.info("Lock eliminado")
     
     def mostrar_banner(self):
         """Muestra el banner informativo"""
         pcloud_dir = self.get_pcloud_dir()
         
-        print("=" * 50)
+        self.console.emit("=" * 50)
         if self.args.subir:
-            print("MODO: SUBIR (Local → pCloud)")
-            print(f"ORIGEN: {self.config.local_dir}")
-            print(f"DESTINO: {pcloud_dir}")
+            self.console.emit("MODO: SUBIR (Local → pCloud)")
+            self.console.emit(f"ORIGEN: {self.config.local_dir}")
+            self.console.emit(f"DESTINO: {pcloud_dir}")
         else:
-            print("MODO: BAJAR (pCloud → Local)")
-            print(f"ORIGEN: {pcloud_dir}")
-            print(f"DESTINO: {self.config.local_dir}")
+            self.console.emit("MODO: BAJAR (pCloud → Local)")
+            self.console.emit(f"ORIGEN: {pcloud_dir}")
+            self.console.emit(f"DESTINO: {self.config.local_dir}")
         
         if self.args.backup_dir:
-            print("DIRECTORIO: Backup de solo lectura (pCloud Backup)")
+            self.console.emit("DIRECTORIO: Backup de solo lectura (pCloud Backup)")
         else:
-            print("DIRECTORIO: Backup común (Backup_Comun)")
+            self.console.emit("DIRECTORIO: Backup común (Backup_Comun)")
         
         if self.args.dry_run:
-            print(f"ESTADO: {Colors.YELLOW}MODO SIMULACIÓN{Colors.NC} (no se realizarán cambios)")
+            self.console.emit(f"ESTADO: {Colors.YELLOW}MODO SIMULACIÓN{Colors.NC} (no se realizarán cambios)")
         
         if self.args.delete:
-            print(f"BORRADO: {Colors.GREEN}ACTIVADO{Colors.NC} (se eliminarán archivos obsoletos)")
+            self.console.emit(f"BORRADO: {Colors.GREEN}ACTIVADO{Colors.NC} (se eliminarán archivos obsoletos)")
         
         if self.args.yes:
-            print("CONFIRMACIÓN: Automática (sin preguntar)")
+            self.console.emit("CONFIRMACIÓN: Automática (sin preguntar)")
         
         if self.args.overwrite:
-            print(f"SOBRESCRITURA: {Colors.GREEN}ACTIVADA{Colors.NC}")
+            self.console.emit(f"SOBRESCRITURA: {Colors.GREEN}ACTIVADA{Colors.NC}")
         else:
-            print("MODO: SEGURO (--update activado)")
+            self.console.emit("MODO: SEGURO (--update activado)")
         
         if self.args.crypto:
-            print(f"CRYPTO: {Colors.GREEN}INCLUIDO{Colors.NC} (se sincronizará directorio Crypto)")
+            self.console.emit(f"CRYPTO: {Colors.GREEN}INCLUIDO{Colors.NC} (se sincronizará directorio Crypto)")
         else:
-            print(f"CRYPTO: {Colors.YELLOW}EXCLUIDO{Colors.NC} (no se sincronizará directorio Crypto)")
+            self.console.emit(f"CRYPTO: {Colors.YELLOW}EXCLUIDO{Colors.NC} (no se sincronizará directorio Crypto)")
         
         if self.args.items:
-            print(f"ELEMENTOS ESPECÍFICOS: {', '.join(self.args.items)}")
+            self.console.emit(f"ELEMENTOS ESPECÍFICOS: {', '.join(self.args.items)}")
         else:
-            hostname = platform.node()
+            hostname = _HOSTNAME
             if hostname in self.config.directorios:
-                print(f"LISTA: Configuración para host {hostname}")
+                self.console.emit(f"LISTA: Configuración para host {hostname}")
             else:
-                print("LISTA: Configuración por defecto")
+                self.console.emit("LISTA: Configuración por defecto")
         
         if self.config.exclusiones:
-            print(f"EXCLUSIONES: {len(self.config.exclusiones)} patrones cargados")
+            self.console.emit(f"EXCLUSIONES: {len(self.config.exclusiones)} patrones cargados")
         
         if self.args.excludes:
-            print(f"EXCLUSIONES CLI ({len(self.args.excludes)} patrones):")
+            self.console.emit(f"EXCLUSIONES CLI ({len(self.args.excludes)} patrones):")
             for i, pattern in enumerate(self.args.excludes, 1):
-                print(f"  {i}. {pattern}")
-        print("=" * 50)
+                self.console.emit(f"  {i}. {pattern}")
+        self.console.emit("=" * 50)
     
     def confirmar_ejecucion(self):
         """Solicita confirmación al usuario antes de ejecutar"""
@@ -655,6 +1458,7 @@ Hostname detectado: {platform.node()}
             return
         
         if sys.stdin.isatty():
+            self.console.flush()
             respuesta = input("¿Desea continuar con la sincronización? [s/N]: ")
             if respuesta.lower() not in ['s', 'si', 'sí']:
                 self.logger.info("Operación cancelada por el usuario.")
@@ -668,14 +1472,14 @@ Hostname detectado: {platform.node()}
         dependencias = ['rsync']
         
         for dep in dependencias:
-            if not shutil.which(dep):
+            if not buscar_ejecutable(dep):
                 self.logger.error(f"{dep} no está instalado. Instálalo con:")
-                if platform.system() == "Linux":
-                    if shutil.which('apt'):
+                if _IS_LINUX:
+                    if buscar_ejecutable('apt'):
                         self.logger.info(f"sudo apt install {dep}  # Debian/Ubuntu")
-                    elif shutil.which('dnf'):
+                    elif buscar_ejecutable('dnf'):
                         self.logger.info(f"sudo dnf install {dep}  # RedHat/CentOS")
-                elif platform.system() == "Darwin":
+                elif _SYSTEM == "Darwin":
                     self.logger.info(f"brew install {dep}  # macOS con Homebrew")
                 sys.exit(1)
     
@@ -684,11 +1488,9 @@ Hostname detectado: {platform.node()}
         if self.args.items:
             return self.args.items
         
-        hostname = platform.node()
-        
         # Buscar configuración específica del host
-        if hostname in self.config.directorios:
-            return self.config.directorios[hostname]
+        if _HOSTNAME in self.config.directorios:
+            return self.config.directorios[_HOSTNAME]
         elif 'default' in self.config.directorios:
             return self.config.directorios['default']
         else:
@@ -697,16 +1499,18 @@ Hostname detectado: {platform.node()}
     
     def validar_elemento(self, elemento: str) -> bool:
         """Valida que un elemento sea seguro y exista"""
-        # Prevenir path traversal
-        if '..' in elemento or elemento.startswith('/'):
-            self.logger.error(f"Elemento contiene path traversal o ruta absoluta: {elemento}")
-            return False
-        
         # Construir ruta completa
         if self.args.subir:
-            ruta_completa = Path(self.config.local_dir) / elemento
+            base = self.config.local_dir
         else:
-            ruta_completa = Path(self.get_pcloud_dir()) / elemento
+            base = self.get_pcloud_dir()
+        ruta_completa = Path(base) / elemento
+        
+        # Prevenir path traversal
+        base_real = self.normalize_path(base)
+        if os.path.isabs(elemento) or not self._within(os.path.normpath(os.path.join(base_real, elemento)), base_real):
+            self.logger.error(f"Elemento contiene path traversal o ruta absoluta: {elemento}")
+            return False
         
         # Verificar existencia
         if not ruta_completa.exists():
@@ -715,10 +1519,29 @@ Hostname detectado: {platform.node()}
         
         return True
     
-    def construir_opciones_rsync(self) -> List[str]:
+    @staticmethod
+    def _within(ruta: str, raiz: str) -> bool:
+        """Indica si la ruta (ya resuelta) queda dentro de la raíz (ya resuelta)"""
+        return os.path.commonpath((ruta, raiz)) == raiz
+    
+    def construir_opciones_rsync(self, files_from: Optional[str] = None) -> List[str]:
         """Construye las opciones para rsync"""
+        # Las opciones comunes no cambian durante la ejecución: se construyen una vez
+        if self._rsync_opts_cache is None:
+            self._rsync_opts_cache = tuple(self._opciones_rsync_comunes())
+        
+        # Con una lista precalculada rsync no necesita recorrer el origen
+        recorrido = [f'--files-from={files_from}', '--from0'] if files_from else ['--recursive']
+        opts = recorrido + list(self._rsync_opts_cache)
+        
+        if self.args.bwlimit:
+            opts.append(f'--bwlimit={max(1, self.args.bwlimit // self.rsync_simultaneos)}')
+        
+        return opts
+    
+    def _opciones_rsync_comunes(self) -> List[str]:
+        """Opciones de rsync que dependen solo de los argumentos y la configuración"""
         opts = [
-            '--recursive',
             '--verbose',
             '--times',
             '--progress',
@@ -739,9 +1562,6 @@ Hostname detectado: {platform.node()}
         if self.args.checksum:
             opts.append('--checksum')
         
-        if self.args.bwlimit:
-            opts.append(f'--bwlimit={self.args.bwlimit}')
-        
         # Añadir exclusiones del archivo de configuración
         for exclusion in self.config.exclusiones:
             opts.append(f'--exclude={exclusion}')
@@ -757,77 +1577,183 @@ Hostname detectado: {platform.node()}
         """Sincroniza un elemento individual"""
         pcloud_dir = self.get_pcloud_dir()
         
-        if self.args.subir:
-            origen = Path(self.config.local_dir) / elemento
-            destino = Path(pcloud_dir) / elemento
-            direccion = "LOCAL → PCLOUD (Subir)"
-        else:
-            origen = Path(pcloud_dir) / elemento
-            destino = Path(self.config.local_dir) / elemento
-            direccion = "PCLOUD → LOCAL (Bajar)"
+        # Extremos ordenados (local, pCloud): el modo indica cuál es el origen
+        extremos = (Path(self.config.local_dir) / elemento, Path(pcloud_dir) / elemento)
+        origen, destino = extremos[self.modo], extremos[1 - self.modo]
+        direccion = DIRECCION_MODO[self.modo]
+        
+        # Verificar que pCloud sigue montado
+        if not self._mount_ok():
+            self.logger.error(f"pCloud ha dejado de estar accesible, se omite: {elemento}")
+            self.stats.bump('errores_sincronizacion')
+            return False
         
         # Verificar existencia del origen
         if not origen.exists():
             self.logger.warning(f"No existe {origen}")
             return False
         
-        # Normalizar rutas para directorios
+        # Directorios con '/' final: rsync y tar dejan el contenido de
+        # origen en destino (PCLOUD/elem/<ruta>), nunca en PCLOUD/elem/elem
         if origen.is_dir():
-            origen = origen / ""
-            destino = destino / ""
+            extremos_rsync = [ruta_contenido(origen), ruta_contenido(destino)]
+        else:
+            extremos_rsync = [str(origen), str(destino)]
         
         # Crear directorio destino si no existe
         destino.parent.mkdir(parents=True, exist_ok=True)
         
         self.logger.info(f"{Colors.BLUE}Sincronizando: {elemento} ({direccion}){Colors.NC}")
         
+        # Destino vacío: copia inicial con un único flujo tar
+        if (not self.args.dry_run and not self.args.bwlimit
+                and origen.is_dir() and directorio_vacio(destino)):
+            if self._sincronizar_con_tar(elemento, origen, destino):
+                return True
+        
+        # Subida sin --delete: listar el árbol local una vez y pasárselo a rsync
+        files_from = None
+        if self.args.subir and not self.args.delete and origen.is_dir():
+            try:
+                files_from = build_files_from(origen, self.obtener_filtro_exclusiones())
+                self.temp_files.add(files_from)
+            except OSError as e:
+                self.logger.debug(f"No se pudo enumerar {origen} ({e}), rsync recorrerá el árbol")
+        
         # Construir comando rsync
-        opts = self.construir_opciones_rsync()
-        cmd = ['rsync'] + opts + [str(origen), str(destino)]
+        opts = self.construir_opciones_rsync(files_from)
+        cmd = ['rsync'] + opts + extremos_rsync
         
         # Ejecutar con timeout si está configurado
         try:
             timeout_seconds = self.args.timeout * 60 if not self.args.dry_run else None
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout_seconds
-            )
+            returncode, cuentas, stderr = self._ejecutar_rsync(cmd, timeout_seconds)
             
             # Analizar salida para estadísticas
-            self._analizar_salida_rsync(result.stdout, result.stderr)
+            self._analizar_salida_rsync(cuentas)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 self.logger.info(f"Sincronización completada: {elemento}")
                 return True
             else:
-                self.logger.error(f"Error en sincronización: {elemento} (código: {result.returncode})")
-                if result.stderr:
-                    self.logger.error(f"Error rsync: {result.stderr}")
-                self.stats.errores_sincronizacion += 1
+                self.logger.error(f"Error en sincronización: {elemento} (código: {returncode})")
+                if returncode in self.RSYNC_IO_ERROR_CODES:
+                    self._mount_ok_until = 0.0
+                if stderr:
+                    self.logger.error(f"Error rsync: {stderr.decode(errors='replace')}")
+                self.stats.bump('errores_sincronizacion')
                 return False
                 
         except subprocess.TimeoutExpired:
             self.logger.error(f"TIMEOUT: La sincronización de '{elemento}' excedió el límite")
-            self.stats.errores_sincronizacion += 1
+            self.stats.bump('errores_sincronizacion')
             return False
+        finally:
+            if files_from:
+                self.temp_files.discard(files_from)
+                os.unlink(files_from)
     
-    def _analizar_salida_rsync(self, stdout: str, stderr: str):
-        """Analiza la salida de rsync para extraer estadísticas"""
-        # Contar archivos transferidos (líneas que comienzan con >f)
-        archivos_creados = len([l for l in stdout.split('\n') if l.startswith('>f')])
-        archivos_actualizados = len([l for l in stdout.split('\n') if l.startswith('>f.st')])
-        total_transferidos = len([l for l in stdout.split('\n') if l.startswith(('>f', '<f'))])
+    def _sincronizar_con_tar(self, elemento: str, origen: Path, destino: Path) -> bool:
+        """Copia inicial de un directorio con tar; False si hay que recurrir a rsync"""
+        # Misma lista y exclusiones que rsync --files-from
+        enlaces: List[str] = []
+        try:
+            files_from = build_files_from(origen, self.obtener_filtro_exclusiones(), enlaces)
+        except OSError as e:
+            self.logger.debug(f"No se pudo enumerar {origen} ({e}), se usará rsync")
+            return False
+        self.temp_files.add(files_from)
+        
+        try:
+            # tar copiaría los enlaces tal cual; rsync los trata con --munge-links
+            if enlaces:
+                self.logger.debug(f"{origen} contiene enlaces simbólicos, se usará rsync")
+                return False
+            
+            self.logger.debug(f"Destino vacío, copia inicial con tar: {destino}")
+            try:
+                returncode, archivos, stderr = initial_sync_tar(
+                    origen, destino, files_from, timeout=self.args.timeout * 60
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                self.logger.warning(f"Copia inicial con tar fallida ({e}), se usará rsync")
+                return False
+            
+            if returncode != 0:
+                self.logger.warning(f"Copia inicial con tar fallida (código: {returncode}), se usará rsync")
+                if stderr:
+                    self.logger.debug(f"Error tar: {stderr.decode(errors='replace')}")
+                return False
+        finally:
+            self.temp_files.discard(files_from)
+            os.unlink(files_from)
+        
+        self.stats.bump('archivos_transferidos', archivos)
+        self.stats.bump('elementos_procesados')
+        self.logger.info(f"Sincronización completada (tar): {elemento}, {archivos} archivos")
+        return True
+    
+    def obtener_filtro_exclusiones(self) -> ExclusionMatcher:
+        """Devuelve el filtro de exclusiones, compilado en el primer uso"""
+        with self._lock:
+            if self.exclusion_matcher is None:
+                self.exclusion_matcher = ExclusionMatcher(
+                    list(self.config.exclusiones) + (self.args.excludes or [])
+                )
+            return self.exclusion_matcher
+    
+    def _ejecutar_rsync(self, cmd: List[str], timeout: Optional[float] = None,
+                        env: Optional[Dict[str, str]] = None) -> Tuple[int, Counter, bytes]:
+        """Ejecuta rsync contando su salida línea a línea; devuelve (código, cuentas, stderr)"""
+        cuentas = Counter()
+        # stderr a un temporal: sin un segundo pipe que pueda llenarse y bloquear a rsync
+        with tempfile.TemporaryFile() as err:
+            proceso = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err, env=env)
+            vencido = threading.Event()
+            
+            def matar():
+                vencido.set()
+                proceso.kill()
+            
+            temporizador = threading.Timer(timeout, matar) if timeout else None
+            if temporizador:
+                temporizador.start()
+            try:
+                with proceso.stdout:
+                    tipos = self._RSYNC_TIPOS_LINEA
+                    for linea in proceso.stdout:
+                        # Un corte y una búsqueda en diccionario por línea, sin regex
+                        tipo = tipos.get(linea[:2])
+                        if tipo is not None:
+                            if tipo == b'>f' and linea[2:3] == b'+':
+                                tipo = b'>f+'
+                            cuentas[tipo] += 1
+                proceso.wait()
+            finally:
+                if temporizador:
+                    temporizador.cancel()
+                if proceso.poll() is None:
+                    proceso.kill()
+                    proceso.wait()
+            
+            if vencido.is_set():
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            
+            err.seek(0)
+            return proceso.returncode, cuentas, err.read()
+    
+    def _analizar_salida_rsync(self, cuentas: Counter):
+        """Actualiza las estadísticas a partir de las cuentas de la salida de rsync"""
+        # Creados y actualizados son disjuntos: cada línea cuenta una sola vez
+        archivos_creados = cuentas[b'>f+']
+        archivos_actualizados = cuentas[b'>f']
         
         # Contar borrados si está habilitado
         if self.args.delete:
-            archivos_borrados = len([l for l in stdout.split('\n') if l.startswith('*deleting')])
-            self.stats.archivos_borrados += archivos_borrados
-        
-        self.stats.archivos_transferidos += total_transferidos
-        self.stats.elementos_procesados += 1
+            self.stats.bump('archivos_borrados', cuentas[b'*deleting'])
+        self.stats.bump('archivos_transferidos', archivos_creados + archivos_actualizados + cuentas[b'<f'])
+        self.stats.bump('elementos_procesados')
         
         if archivos_creados > 0:
             self.logger.info(f"Archivos creados: {archivos_creados}")
@@ -849,66 +1775,89 @@ Hostname detectado: {platform.node()}
         
         self.logger.info("Generando archivo de enlaces simbólicos...")
         
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, prefix='syncb_links_') as temp_file:
-            self.temp_files.add(temp_file.name)
-            
-            for elemento in elementos:
-                if not self.validar_elemento(elemento):
-                    continue
-                
-                ruta_completa = Path(self.config.local_dir) / elemento
-                
-                if ruta_completa.is_symlink():
-                    self._registrar_enlace(ruta_completa, temp_file.name)
-                elif ruta_completa.is_dir():
-                    self._buscar_enlaces_en_directorio(ruta_completa, temp_file.name)
-            
-            # Sincronizar archivo de enlaces a pCloud
-            if os.path.getsize(temp_file.name) > 0:
-                opts = self.construir_opciones_rsync()
-                cmd = ['rsync'] + opts + [temp_file.name, str(archivo_enlaces)]
-                
-                try:
-                    subprocess.run(cmd, check=True, capture_output=True)
-                    self.logger.info(f"Enlaces detectados/guardados: {self.stats.enlaces_detectados}")
-                    self.logger.info("Archivo de enlaces sincronizado")
-                except subprocess.CalledProcessError as e:
-                    self.logger.error(f"Error sincronizando archivo de enlaces: {e}")
-    
-    def _registrar_enlace(self, enlace: Path, archivo_enlaces: str):
-        """Registra un enlace simbólico individual"""
+        lineas: List[str] = []
+        
+        # Cada elemento se recorre en su propio hilo (E/S sobre el sistema de archivos);
+        # los resultados se unen en el orden de la lista para que el archivo sea estable
+        transfers = max(1, self.args.transfers or self.config.transfers)
+        with ThreadPoolExecutor(max_workers=max(1, min(transfers, len(elementos)))) as executor:
+            futuros = [executor.submit(self._recoger_enlaces, elemento) for elemento in elementos]
+            for futuro in futuros:
+                lineas.extend(futuro.result())
+        
+        # Una línea por enlace: se contabilizan al unir los resultados, sin contención entre hilos
+        self.stats.bump('enlaces_detectados', len(lineas))
+        
+        if not lineas:
+            return
+        
+        # pCloud está montado localmente: se escribe el archivo directamente, sin lanzar
+        # rsync, en un temporal junto al destino que luego se renombra (como hace rsync)
+        if not self.args.dry_run:
+            try:
+                with tempfile.NamedTemporaryFile(mode='w', dir=archivo_enlaces.parent, delete=False,
+                                                 prefix='.syncb_links_') as temp_file:
+                    self.temp_files.add(temp_file.name)
+                    temp_file.write(''.join(lineas))
+                os.replace(temp_file.name, archivo_enlaces)
+                self.temp_files.discard(temp_file.name)
+            except OSError as e:
+                self.logger.error(f"Error sincronizando archivo de enlaces: {e}")
+                return
+        
+        self.logger.info(f"Enlaces detectados/guardados: {self.stats.enlaces_detectados}")
+        self.logger.info("Archivo de enlaces sincronizado")
+    
+    def _recoger_enlaces(self, elemento: str) -> List[str]:
+        """Devuelve las líneas de metadatos de los enlaces simbólicos de un elemento"""
+        lineas: List[str] = []
+        if not self.validar_elemento(elemento):
+            return lineas
+        
+        ruta_completa = os.path.normpath(os.path.join(self.config.local_dir, elemento))
+        
+        # Un único lstat para distinguir enlace y directorio
         try:
-            # Obtener ruta relativa
-            ruta_relativa = enlace.relative_to(Path(self.config.local_dir))
-            
-            # Obtener destino del enlace
-            destino = enlace.readlink()
-            
-            # Normalizar destino
-            if str(destino).startswith(str(Path(self.config.local_dir))):
-                destino = Path('/home/$USERNAME') / destino.relative_to(Path(self.config.local_dir))
-            elif str(destino).startswith('/home/'):
-                partes = destino.parts[2:]  # Eliminar /home/username
-                destino = Path('/home/$USERNAME') / Path(*partes)
+            modo = os.lstat(ruta_completa).st_mode
+        except OSError:
+            return lineas
+        if stat.S_ISLNK(modo):
+            self._registrar_enlace(ruta_completa, os.readlink(ruta_completa), lineas)
+        elif stat.S_ISDIR(modo):
+            self._buscar_enlaces_en_directorio(ruta_completa, lineas)
+        return lineas
+    
+    def _registrar_enlace(self, enlace: str, destino_enlace: str, lineas: List[str]):
+        """Registra un enlace simbólico individual en la lista de líneas"""
+        try:
+            # Obtener ruta relativa: las rutas del recorrido ya cuelgan de local_dir
+            prefijo = self._local_dir_prefijo
+            if not enlace.startswith(prefijo):
+                raise ValueError(f"{enlace} no está dentro de {self.config.local_dir}")
+            ruta_relativa = enlace[len(prefijo):]
             
-            # Escribir en archivo
-            with open(archivo_enlaces, 'a') as f:
-                f.write(f"{ruta_relativa}\t{destino}\n")
+            # Normalizar destino (solo operaciones de cadena, sin objetos Path)
+            destino = destino_enlace
+            if destino == self._local_dir_str or destino.startswith(prefijo):
+                destino = '/home/$USERNAME' + destino[len(self._local_dir_str):]
+            elif destino.startswith('/home/'):
+                # Eliminar /home/username
+                partes = destino.split('/', 3)
+                destino = '/home/$USERNAME' + ('/' + partes[3] if len(partes) > 3 else '')
             
-            self.stats.enlaces_detectados += 1
-            self.logger.debug(f"Registrado enlace: {ruta_relativa} -> {destino}")
+            lineas.append(f"{ruta_relativa}\t{destino}\n")
+            self.logger.debug("Registrado enlace: %s -> %s", ruta_relativa, destino)
             
         except (ValueError, OSError) as e:
             self.logger.warning(f"Error procesando enlace {enlace}: {e}")
     
-    def _buscar_enlaces_en_directorio(self, directorio: Path, archivo_enlaces: str):
+    def _buscar_enlaces_en_directorio(self, directorio: str, lineas: List[str]):
         """Busca enlaces simbólicos en un directorio recursivamente"""
-        try:
-            for item in directorio.rglob('*'):
-                if item.is_symlink():
-                    self._registrar_enlace(item, archivo_enlaces)
-        except OSError as e:
+        def onerror(e: OSError):
             self.logger.warning(f"Error buscando enlaces en {directorio}: {e}")
+        
+        for ruta, destino in iter_symlinks(directorio, onerror):
+            self._registrar_enlace(ruta, destino, lineas)
     
     def _recrear_enlaces_desde_archivo(self):
         """Recrea enlaces simbólicos desde el archivo de metadatos"""
@@ -918,76 +1867,95 @@ Hostname detectado: {platform.node()}
         
         self.logger.info("Recreando enlaces simbólicos...")
         
-        # Copiar archivo localmente si existe en pCloud
+        # Leer directamente el archivo de pCloud, sin copiarlo antes al directorio local;
+        # una copia local (p. ej. de una ejecución anterior) solo se usa si falta en pCloud
         if archivo_enlaces_origen.exists():
-            shutil.copy2(archivo_enlaces_origen, archivo_enlaces_local)
-        elif not archivo_enlaces_local.exists():
+            archivo_enlaces = archivo_enlaces_origen
+        elif archivo_enlaces_local.exists():
+            archivo_enlaces = archivo_enlaces_local
+        else:
             self.logger.info("No se encontró archivo de enlaces, omitiendo recreación")
             return
         
         # Procesar archivo de enlaces
         try:
-            with open(archivo_enlaces_local, 'r') as f:
-                for linea in f:
-                    linea = linea.strip()
-                    if not linea or '\t' not in linea:
-                        continue
-                    
-                    ruta_enlace, destino = linea.split('\t', 1)
-                    self._procesar_linea_enlace(ruta_enlace, destino)
+            # Directorios padre ya creados: un único makedirs por directorio, no por enlace
+            dirs_creados: Set[str] = set()
+            # Agrupados por directorio padre (orden estable): operaciones consecutivas
+            # sobre el mismo directorio aprovechan la caché de dentries
+            entradas = read_symlinks_meta(archivo_enlaces)
+            entradas.sort(key=lambda entrada: os.path.dirname(entrada[0]))
+            for ruta_enlace, destino in entradas:
+                self._procesar_linea_enlace(ruta_enlace, destino, dirs_creados)
             
             self.logger.info(f"Enlaces recreados: {self.stats.enlaces_creados}, "
                            f"Errores: {self.stats.enlaces_errores}")
             
             # Limpiar archivo local
-            if not self.args.dry_run:
+            if not self.args.dry_run and archivo_enlaces is archivo_enlaces_local:
                 archivo_enlaces_local.unlink()
                 
-        except OSError as e:
+        except (OSError, UnicodeDecodeError) as e:
             self.logger.error(f"Error procesando archivo de enlaces: {e}")
     
-    def _procesar_linea_enlace(self, ruta_enlace: str, destino: str):
+    def _procesar_linea_enlace(self, ruta_enlace: str, destino: str, dirs_creados: Optional[Set[str]] = None):
         """Procesa una línea del archivo de enlaces"""
-        ruta_completa = Path(self.config.local_dir) / ruta_enlace
-        dir_padre = ruta_completa.parent
-        
-        # Crear directorio padre si no existe
-        if not self.args.dry_run:
-            dir_padre.mkdir(parents=True, exist_ok=True)
+        # Solo cadenas y funciones de os: sin objetos Path por cada línea
+        ruta_completa = os.path.join(self._local_dir_str, ruta_enlace.rstrip('/'))
+        dir_padre, nombre = os.path.split(ruta_completa)
+        
+        # El archivo de enlaces viene de pCloud: no crear nada fuera de local_dir
+        local_real = self.normalize_path(self.config.local_dir)
+        candidato = os.path.normpath(os.path.join(self.normalize_path(dir_padre), nombre))
+        if os.path.isabs(ruta_enlace) or not self._within(candidato, local_real) or candidato == local_real:
+            self.logger.error(f"Enlace fuera del directorio local, se omite: {ruta_enlace}")
+            self.stats.bump('enlaces_errores')
+            return
         
         # Normalizar destino
-        destino_normalizado = destino.replace('$USERNAME', os.getenv('USER', 'user'))
-        if destino_normalizado.startswith('/home/$USERNAME'):
-            destino_normalizado = destino_normalizado.replace('/home/$USERNAME', str(Path.home()))
-        
-        # Verificar si el enlace ya existe y es correcto
-        if ruta_completa.exists():
-            if ruta_completa.is_symlink():
-                destino_actual = ruta_completa.readlink()
-                if str(destino_actual) == destino_normalizado:
-                    self.stats.enlaces_existentes += 1
-                    return
-                else:
-                    # Eliminar enlace existente incorrecto
-                    if not self.args.dry_run:
-                        ruta_completa.unlink()
+        # (primero el prefijo /home/$USERNAME, que si no quedaría sustituido por el usuario)
+        if destino.startswith('/home/$USERNAME'):
+            destino = self._home + destino[len('/home/$USERNAME'):]
+        destino_normalizado = destino.replace('$USERNAME', self._usuario)
         
-        # Crear el enlace
+        # Verificar si el enlace ya existe y es correcto (un único lstat)
+        try:
+            modo_actual = os.lstat(ruta_completa).st_mode
+        except FileNotFoundError:
+            modo_actual = None
+        reemplazar = modo_actual is not None and stat.S_ISLNK(modo_actual)
+        if reemplazar and os.readlink(ruta_completa) == destino_normalizado:
+            self.stats.bump('enlaces_existentes')
+            return
+        
+        # Simulación: con el lstat basta para saber qué se haría
         if self.args.dry_run:
-            self.logger.debug(f"SIMULACIÓN: Enlace a crear: {ruta_completa} -> {destino_normalizado}")
-            self.stats.enlaces_creados += 1
-        else:
-            try:
-                ruta_completa.symlink_to(destino_normalizado)
-                self.stats.enlaces_creados += 1
-                self.logger.debug(f"Enlace creado: {ruta_completa} -> {destino_normalizado}")
-            except OSError as e:
-                self.logger.error(f"Error creando enlace {ruta_completa}: {e}")
-                self.stats.enlaces_errores += 1
+            self.logger.debug("SIMULACIÓN: Enlace a %s: %s -> %s", "reemplazar" if reemplazar else "crear",
+                              ruta_completa, destino_normalizado)
+            self.stats.bump('enlaces_creados')
+            return
+        
+        if reemplazar:
+            # Eliminar enlace existente incorrecto
+            os.unlink(ruta_completa)
+        elif modo_actual is None and (dirs_creados is None or dir_padre not in dirs_creados):
+            # Crear directorio padre si no existe (si la ruta existía, el padre también)
+            os.makedirs(dir_padre, exist_ok=True)
+            if dirs_creados is not None:
+                dirs_creados.add(dir_padre)
+        
+        # Crear el enlace
+        try:
+            os.symlink(destino_normalizado, ruta_completa)
+            self.stats.bump('enlaces_creados')
+            self.logger.debug("Enlace creado: %s -> %s", ruta_completa, destino_normalizado)
+        except OSError as e:
+            self.logger.error(f"Error creando enlace {ruta_completa}: {e}")
+            self.stats.bump('enlaces_errores')
     
     def sincronizar_crypto(self):
         """Sincroniza el directorio Crypto"""
-        hostname = platform.node()
+        hostname = _HOSTNAME
         
         if hostname == self.config.hostname_rtva:
             if self.args.subir:
@@ -1010,7 +1978,7 @@ Hostname detectado: {platform.node()}
         origen.mkdir(parents=True, exist_ok=True)
         destino.mkdir(parents=True, exist_ok=True)
         
-        print("-" * 50)
+        self.console.emit("-" * 50)
         self.logger.info(f"{Colors.BLUE}Sincronizando Crypto: {origen} -> {destino} ({direccion}){Colors.NC}")
         
         # Construir opciones específicas para Crypto
@@ -1019,42 +1987,75 @@ Hostname detectado: {platform.node()}
         # Excluir archivo de verificación de montaje
         opts.append(f'--exclude={self.config.cloud_mount_check_file}')
         
-        # Sincronizar KeePass2Android primero
-        keepass_origen = Path(self.config.remote_keepass_dir) / ""
-        keepass_destino = Path(self.config.local_keepass_dir) / ""
+        # Sincronizar KeePass2Android primero. No se une al rsync de Crypto: tiene otro par
+        # origen/destino y su destino local cuelga de Crypto, que debe incluirlo ya actualizado
+        keepass_origen = Path(self.config.remote_keepass_dir)
+        keepass_destino = Path(self.config.local_keepass_dir)
+        
+        # Con --rsync-daemon, un único demonio sirve ambos orígenes (evita arrancar rsync local completo)
+        modulos = {'keepass': keepass_origen, 'crypto': origen}
         
         if keepass_origen.exists() and keepass_destino.parent.exists():
-            cmd_keepass = ['rsync'] + opts + [str(keepass_origen), str(keepass_destino)]
+            daemon = self._obtener_rsync_daemon(modulos)
+            fuente = daemon.url('keepass') if daemon else ruta_contenido(keepass_origen)
+            cmd_keepass = ['rsync'] + opts + [fuente, ruta_contenido(keepass_destino)]
+            timeout_seconds = self.args.timeout * 60 if not self.args.dry_run else None
             try:
-                subprocess.run(cmd_keepass, check=True, capture_output=True)
-            except subprocess.CalledProcessError as e:
+                returncode, _, stderr = self._ejecutar_rsync(cmd_keepass, timeout_seconds,
+                                                             env=daemon.env() if daemon else None)
+                if returncode != 0:
+                    self.logger.warning(f"Error sincronizando KeePass (código: {returncode}): "
+                                        f"{stderr.decode(errors='replace').strip()}")
+            except (OSError, subprocess.TimeoutExpired) as e:
                 self.logger.warning(f"Error sincronizando KeePass: {e}")
         
         # Sincronizar directorio Crypto principal
-        cmd = ['rsync'] + opts + [str(origen / ""), str(destino / "")]
+        daemon = self._obtener_rsync_daemon(modulos)
+        fuente = daemon.url('crypto') if daemon else ruta_contenido(origen)
+        cmd = ['rsync'] + opts + [fuente, ruta_contenido(destino)]
         
         try:
             timeout_seconds = self.args.timeout * 60 if not self.args.dry_run else None
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_seconds)
+            returncode, cuentas, _ = self._ejecutar_rsync(cmd, timeout_seconds,
+                                                          env=daemon.env() if daemon else None)
             
             # Contar archivos transferidos
-            crypto_count = len([l for l in result.stdout.split('\n') if l.startswith(('>f', '<f'))])
-            self.stats.archivos_crypto_transferidos += crypto_count
+            crypto_count = sum(n for m, n in cuentas.items() if m != b'*deleting')
+            self.stats.bump('archivos_crypto_transferidos', crypto_count)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 self.logger.info(f"Sincronización Crypto completada: {crypto_count} archivos transferidos")
-                print("-" * 50)
+                self.console.emit("-" * 50)
                 return True
             else:
-                self.logger.error(f"Error en sincronización Crypto (código: {result.returncode})")
-                self.stats.errores_sincronizacion += 1
+                self.logger.error(f"Error en sincronización Crypto (código: {returncode})")
+                if returncode in self.RSYNC_IO_ERROR_CODES:
+                    self._mount_ok_until = 0.0
+                self.stats.bump('errores_sincronizacion')
                 return False
                 
         except subprocess.TimeoutExpired:
             self.logger.error("TIMEOUT: La sincronización Crypto excedió el límite")
-            self.stats.errores_sinconizacion += 1
+            self.stats.bump('errores_sincronizacion')
             return False
     
+    def _obtener_rsync_daemon(self, modulos: Dict[str, Path]) -> Optional[RsyncDaemon]:
+        """Arranca (una vez) el demonio rsync local; None si no se pidió o no arranca"""
+        if not self.args.rsync_daemon or self.rsync_daemon_fallido:
+            return None
+        if self.rsync_daemon is None:
+            daemon = RsyncDaemon(modulos)
+            try:
+                daemon.start()
+            except (OSError, RuntimeError) as e:
+                daemon.stop()
+                self.logger.warning(f"No se pudo arrancar el demonio rsync ({e}), se usa rsync local")
+                self.rsync_daemon_fallido = True
+                return None
+            self.rsync_daemon = daemon
+            self.logger.debug(f"Demonio rsync escuchando en 127.0.0.1:{daemon.puerto}")
+        return self.rsync_daemon
+    
     def aplicar_permisos(self):
         """Aplica los permisos configurados a archivos y directorios"""
         if not self.config.permisos_archivos and not self.config.permisos_directorios:
@@ -1062,42 +2063,76 @@ Hostname detectado: {platform.node()}
         
         self.logger.info("Aplicando permisos...")
         
-        # Aplicar permisos a archivos
-        for patron, permisos in self.config.permisos_archivos.items():
-            self._aplicar_permisos_patron(patron, permisos, es_directorio=False)
-        
-        # Aplicar permisos a directorios
-        for patron, permisos in self.config.permisos_directorios.items():
-            self._aplicar_permisos_patron(patron, permisos, es_directorio=True)
+        # Rutas concretas primero; el recorrido aplica después los patrones, que solo
+        # pisan una ruta concreta si aparecen detrás de ella en la configuración
+        concretas, archivos, directorios = self.obtener_reglas_permisos()
+        for ruta, permisos_int, es_directorio in concretas:
+            self._aplicar_permisos_ruta(ruta, permisos_int, es_directorio)
+        
+        if archivos or directorios:
+            onerror = lambda e: self.logger.warning(f"Error aplicando permisos: {e}")
+            for ruta, modo, dir_fd, nombre in iter_cambios_permisos(self.config.local_dir, archivos,
+                                                                    directorios, onerror):
+                self._chmod(ruta, modo, dir_fd, nombre)
     
-    def _aplicar_permisos_patron(self, patron: str, permisos: str, es_directorio: bool):
-        """Aplica permisos a un patrón específico"""
+    def obtener_reglas_permisos(self):
+        """Devuelve (rutas concretas, reglas de archivos, reglas de directorios), compiladas una vez"""
+        if self.reglas_permisos is None:
+            # Las rutas concretas se aplican directamente; los patrones con comodín se
+            # resuelven en un solo recorrido. Para respetar el orden de la configuración
+            # (gana la última regla), el recorrido también recibe las rutas concretas como
+            # reglas ancladas sin modo: si una de ellas es la última que coincide, no se toca
+            concretas = []
+            reglas_recorrido = {False: [], True: []}
+            hay_globs = {False: False, True: False}
+            for es_directorio, reglas in ((False, self.config.permisos_archivos),
+                                          (True, self.config.permisos_directorios)):
+                for patron, permisos in reglas.items():
+                    try:
+                        permisos_int = int(permisos, 8)
+                    except ValueError as e:
+                        self.logger.warning(f"Error aplicando permisos a {patron}: {e}")
+                        continue
+                    if '*' in patron:
+                        reglas_recorrido[es_directorio].append((patron, permisos_int, False))
+                        hay_globs[es_directorio] = True
+                    else:
+                        concretas.append((os.path.join(self.config.local_dir, patron),
+                                          permisos_int, es_directorio))
+                        relativa = os.path.normpath(patron)
+                        if not os.path.isabs(relativa) and relativa.split(os.sep)[0] != '..':
+                            reglas_recorrido[es_directorio].append((relativa, None, True))
+            archivos, directorios = (
+                compilar_reglas_permisos(reglas_recorrido[tipo]) if hay_globs[tipo] else []
+                for tipo in (False, True)
+            )
+            self.reglas_permisos = (concretas, archivos, directorios)
+        return self.reglas_permisos
+    
+    def _aplicar_permisos_ruta(self, ruta: str, permisos: int, es_directorio: bool):
+        """Aplica permisos a una ruta específica si no los tiene ya"""
         try:
-            # Convertir permisos de string octal a int
-            permisos_int = int(permisos, 8)
-            
-            if '*' in patron:
-                # Patrón con comodín - usar glob
-                directorio_base = Path(self.config.local_dir)
-                archivos = list(directorio_base.rglob(patron))
-                
-                for archivo in archivos:
-                    if es_directorio == archivo.is_dir():
-                        if self.args.dry_run:
-                            self.logger.debug(f"SIMULACIÓN: chmod {permisos} {archivo}")
-                        else:
-                            archivo.chmod(permisos_int)
+            st = os.stat(ruta)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            self.logger.warning(f"Error aplicando permisos a {ruta}: {e}")
+            return
+        if es_directorio == stat.S_ISDIR(st.st_mode) and stat.S_IMODE(st.st_mode) != permisos:
+            self._chmod(ruta, permisos)
+    
+    def _chmod(self, ruta: str, permisos: int, dir_fd: Optional[int] = None, nombre: Optional[str] = None):
+        """chmod de ruta; con dir_fd se aplica a nombre relativo a ese directorio"""
+        if self.args.dry_run:
+            self.logger.debug("SIMULACIÓN: chmod %o %s", permisos, ruta)
+            return
+        try:
+            if dir_fd is not None:
+                os.chmod(nombre, permisos, dir_fd=dir_fd)
             else:
-                # Ruta específica
-                ruta_completa = Path(self.config.local_dir) / patron
-                if ruta_completa.exists() and es_directorio == ruta_completa.is_dir():
-                    if self.args.dry_run:
-                        self.logger.debug(f"SIMULACIÓN: chmod {permisos} {ruta_completa}")
-                    else:
-                        ruta_completa.chmod(permisos_int)
-                        
-        except (ValueError, OSError) as e:
-            self.logger.warning(f"Error aplicando permisos a {patron}: {e}")
+                os.chmod(ruta, permisos)
+        except OSError as e:
+            self.logger.warning(f"Error aplicando permisos a {ruta}: {e}")
     
     def mostrar_estadisticas(self):
         """Muestra las estadísticas de la sincronización"""
@@ -1106,47 +2141,50 @@ Hostname detectado: {platform.node()}
         minutos = int((tiempo_total % 3600) // 60)
         segundos = int(tiempo_total % 60)
         
-        print("\n" + "=" * 50)
-        print("RESUMEN DE SINCRONIZACIÓN")
-        print("=" * 50)
-        print(f"Elementos procesados: {self.stats.elementos_procesados}")
-        print(f"Archivos transferidos: {self.stats.archivos_transferidos}")
+        self.console.emit("\n" + "=" * 50)
+        self.console.emit("RESUMEN DE SINCRONIZACIÓN")
+        self.console.emit("=" * 50)
+        self.console.emit(f"Elementos procesados: {self.stats.elementos_procesados}")
+        self.console.emit(f"Archivos transferidos: {self.stats.archivos_transferidos}")
         
         if self.args.crypto:
-            print(f"Archivos Crypto transferidos: {self.stats.archivos_crypto_transferidos}")
+            self.console.emit(f"Archivos Crypto transferidos: {self.stats.archivos_crypto_transferidos}")
         
         if self.args.delete:
-            print(f"Archivos borrados en destino: {self.stats.archivos_borrados}")
+            self.console.emit(f"Archivos borrados en destino: {self.stats.archivos_borrados}")
         
         if self.args.excludes:
-            print(f"Exclusiones CLI aplicadas: {len(self.args.excludes)} patrones")
+            self.console.emit(f"Exclusiones CLI aplicadas: {len(self.args.excludes)} patrones")
         
-        print(f"Enlaces manejados: {self.stats.enlaces_creados + self.stats.enlaces_existentes}")
-        print(f"  - Enlaces detectados/guardados: {self.stats.enlaces_detectados}")
-        print(f"  - Enlaces creados: {self.stats.enlaces_creados}")
-        print(f"  - Enlaces existentes: {self.stats.enlaces_existentes}")
-        print(f"  - Enlaces con errores: {self.stats.enlaces_errores}")
-        print(f"Errores de sincronización: {self.stats.errores_sincronizacion}")
+        self.console.emit(f"Enlaces manejados: {self.stats.enlaces_creados + self.stats.enlaces_existentes}")
+        self.console.emit(f"  - Enlaces detectados/guardados: {self.stats.enlaces_detectados}")
+        self.console.emit(f"  - Enlaces creados: {self.stats.enlaces_creados}")
+        self.console.emit(f"  - Enlaces existentes: {self.stats.enlaces_existentes}")
+        self.console.emit(f"  - Enlaces con errores: {self.stats.enlaces_errores}")
+        self.console.emit(f"Errores de sincronización: {self.stats.errores_sincronizacion}")
         
         if tiempo_total >= 3600:
-            print(f"Tiempo total: {horas}h {minutos}m {segundos}s")
+            self.console.emit(f"Tiempo total: {horas}h {minutos}m {segundos}s")
         elif tiempo_total >= 60:
-            print(f"Tiempo total: {minutos}m {segundos}s")
+            self.console.emit(f"Tiempo total: {minutos}m {segundos}s")
         else:
-            print(f"Tiempo total: {segundos}s")
+            self.console.emit(f"Tiempo total: {segundos}s")
         
         archivos_por_segundo = (self.stats.archivos_transferidos / 
                                (tiempo_total if tiempo_total > 0 else 1))
-        print(f"Velocidad promedio: {archivos_por_segundo:.1f} archivos/segundo")
+        self.console.emit(f"Velocidad promedio: {archivos_por_segundo:.1f} archivos/segundo")
         
         modo = "SIMULACIÓN" if self.args.dry_run else "EJECUCIÓN REAL"
-        print(f"Modo: {modo}")
-        print("=" * 50)
+        self.console.emit(f"Modo: {modo}")
+        self.console.emit("=" * 50)
+    
+    # Niveles de urgencia de org.freedesktop.Notifications
+    URGENCIAS_DBUS = {'low': 0, 'normal': 1, 'critical': 2}
     
     def enviar_notificacion(self, titulo: str, mensaje: str, tipo: str = "info"):
         """Envía una notificación del sistema"""
         try:
-            if platform.system() == "Linux" and shutil.which('notify-send'):
+            if _IS_LINUX and (jeepney is not None or buscar_ejecutable('notify-send')):
                 urgencia = "normal"
                 icono = "dialog-information"
                 
@@ -1157,11 +2195,13 @@ Hostname detectado: {platform.node()}
                     urgencia = "normal"
                     icono = "dialog-warning"
                 
-                subprocess.run([
-                    'notify-send', '--urgency', urgencia, '--icon', icono, titulo, mensaje
-                ], capture_output=True)
+                # Directamente por D-Bus si es posible; si no, lanzando notify-send
+                if not self._notificar_dbus(titulo, mensaje, urgencia, icono) and buscar_ejecutable('notify-send'):
+                    subprocess.run([
+                        'notify-send', '--urgency', urgencia, '--icon', icono, titulo, mensaje
+                    ], capture_output=True)
                 
-            elif platform.system() == "Darwin" and shutil.which('osascript'):
+            elif _SYSTEM == "Darwin" and buscar_ejecutable('osascript'):
                 script = f'display notification "{mensaje}" with title "{titulo}"'
                 subprocess.run(['osascript', '-e', script], capture_output=True)
                 
@@ -1171,11 +2211,31 @@ Hostname detectado: {platform.node()}
                     icon = "❌"
                 elif tipo == "warning":
                     icon = "⚠️"
-                print(f"\n{icon} {titulo}: {mensaje}")
+                self.console.emit(f"\n{icon} {titulo}: {mensaje}")
                 
         except (subprocess.SubprocessError, OSError):
             pass  # Silenciosamente fallar si no se pueden enviar notificaciones
     
+    def _notificar_dbus(self, titulo: str, mensaje: str, urgencia: str, icono: str) -> bool:
+        """Envía la notificación al servidor de notificaciones por D-Bus; False si no es posible"""
+        if jeepney is None:
+            return False
+        destino = jeepney.DBusAddress('/org/freedesktop/Notifications',
+                                      bus_name='org.freedesktop.Notifications',
+                                      interface='org.freedesktop.Notifications')
+        msg = jeepney.new_method_call(destino, 'Notify', 'susssasa{sv}i', (
+            'syncb', 0, icono, titulo, mensaje, [],
+            {'urgency': ('y', self.URGENCIAS_DBUS[urgencia])}, -1
+        ))
+        try:
+            with jeepney.io.blocking.open_dbus_connection(bus='SESSION') as conn:
+                conn.send_and_get_reply(msg, timeout=2)
+        except Exception as e:
+            # Sin bus de sesión, sin servidor de notificaciones o error D-Bus
+            self.logger.debug(f"Notificación por D-Bus fallida: {e}")
+            return False
+        return True
+    
     def notificar_finalizacion(self, exit_code: int):
         """Envía notificación de finalización"""
         time.sleep(0.5)  # Pequeña pausa
@@ -1226,18 +2286,55 @@ Hostname detectado: {platform.node()}
         
         self.logger.info(f"Sincronizando {len(elementos)} elementos")
         
+        validos = []
         for elemento in elementos:
-            if not self.validar_elemento(elemento):
+            if self.validar_elemento(elemento):
+                validos.append(elemento)
+            else:
                 exit_code = False
+        
+        # Los elementos anidados entre sí no pueden sincronizarse a la vez
+        transfers = max(1, self.args.transfers or self.config.transfers)
+        en_serie = self._elementos_solapados(validos) if transfers > 1 else set(validos)
+        paralelos = [e for e in validos if e not in en_serie]
+        
+        if paralelos:
+            hilos = min(transfers, len(paralelos))
+            self.logger.debug(f"Sincronizando {len(paralelos)} elementos con {hilos} hilos")
+            # El límite de ancho de banda se reparte entre los rsync simultáneos
+            self.rsync_simultaneos = hilos
+            try:
+                with ThreadPoolExecutor(max_workers=hilos) as executor:
+                    futuros = [executor.submit(self.sincronizar_elemento, e) for e in paralelos]
+                    for futuro in as_completed(futuros):
+                        if not futuro.result():
+                            exit_code = False
+                        self.console.emit("-" * 50)
+            finally:
+                self.rsync_simultaneos = 1
+        
+        for elemento in validos:
+            if elemento not in en_serie:
                 continue
             
             if not self.sincronizar_elemento(elemento):
                 exit_code = False
             
-            print("-" * 50)
+            self.console.emit("-" * 50)
         
         return exit_code
     
+    @staticmethod
+    def _elementos_solapados(elementos: List[str]) -> Set[str]:
+        """Devuelve los elementos que contienen o están contenidos en otro elemento"""
+        rutas = {e: e.rstrip('/') + '/' for e in elementos}
+        solapados = set()
+        for a, ruta_a in rutas.items():
+            for b, ruta_b in rutas.items():
+                if a != b and ruta_b.startswith(ruta_a):
+                    solapados.update((a, b))
+        return solapados
+    
     def sincronizar(self) -> int:
         """Función principal de sincronización"""
         self.logger.info(f"Iniciando proceso de sincronización en modo: "
@@ -1281,16 +2378,24 @@ Hostname detectado: {platform.node()}
     def cleanup(self):
         """Limpia recursos temporales"""
         # Eliminar archivos temporales
-        for temp_file in self.temp_files:
+        for temp_file in list(self.temp_files):
+            # Un único unlink: sin comprobar antes si existe
             try:
-                if Path(temp_file).exists():
-                    Path(temp_file).unlink()
-                    self.logger.debug(f"Eliminado temporal: {temp_file}")
+                os.unlink(temp_file)
             except OSError:
-                pass
+                continue
+            self.logger.debug(f"Eliminado temporal: {temp_file}")
+        
+        # Detener el demonio rsync
+        if self.rsync_daemon is not None:
+            self.rsync_daemon.stop()
+            self.rsync_daemon = None
         
         # Eliminar lock
         self.eliminar_lock()
+        
+        # Vaciar la salida de consola pendiente
+        self.console.close()
     
     def run(self) -> int:
         """Ejecuta el proceso completo de sincronización"""
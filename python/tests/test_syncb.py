@@ -0,0 +1,150 @@
+"""Tests de syncb: disposición de los archivos copiados en destino"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import syncb  # noqa: E402
+
+
+def arbol(raiz: Path) -> set:
+    """Rutas relativas de todos los archivos y directorios bajo raiz"""
+    return {str(p.relative_to(raiz)) for p in raiz.rglob('*')}
+
+
+class SyncBTestCase(unittest.TestCase):
+    """Instancia SyncB sobre un directorio local y un 'pCloud' temporales"""
+
+    ELEMENTO = 'Documentos'
+    # Secciones TOML adicionales de la configuración de la prueba
+    CONFIG_EXTRA = ''
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='syncb_test_'))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.local = self.tmp / 'local'
+        self.pcloud = self.tmp / 'pcloud'
+        self.pcloud.mkdir()
+
+        origen = self.local / self.ELEMENTO
+        (origen / 'sub' / 'profundo').mkdir(parents=True)
+        (origen / 'a.txt').write_text('a')
+        (origen / 'sub' / 'b.txt').write_text('b')
+        (origen / 'sub' / 'profundo' / 'c.txt').write_text('c')
+
+        config = self.tmp / 'config.toml'
+        config.write_text(
+            '[general]\n'
+            f'local_dir = "{self.local}"\n'
+            f'pcloud_backup_comun = "{self.pcloud}"\n'
+            + self.CONFIG_EXTRA
+        )
+
+        # Caché de configuración, log y lock dentro del directorio temporal
+        entorno = mock.patch.dict(os.environ, {'HOME': str(self.tmp)})
+        entorno.start()
+        self.addCleanup(entorno.stop)
+        self.config_path = str(config)
+
+    def crear_syncb(self, *argv: str) -> syncb.SyncB:
+        """SyncB con los argumentos dados y el montaje de pCloud dado por bueno"""
+        sb = syncb.SyncB(self.config_path)
+        with mock.patch.object(sys, 'argv', ['syncb.py', *argv]):
+            sb.parse_arguments()
+        sb._mount_ok = lambda: True
+        return sb
+
+    def destino(self) -> Path:
+        return self.pcloud / self.ELEMENTO
+
+
+@unittest.skipIf(shutil.which('rsync') is None, "rsync no está instalado")
+class TestDisposicionRsync(SyncBTestCase):
+    """rsync deja el contenido del elemento en PCLOUD/elemento con y sin --files-from"""
+
+    def sincronizar(self, *argv: str) -> set:
+        sb = self.crear_syncb('--subir', '--yes', *argv)
+        # Destino no vacío: se usa rsync, no la copia inicial con tar
+        self.destino().mkdir(parents=True, exist_ok=True)
+        (self.destino() / 'existente.txt').write_text('x')
+        self.assertTrue(sb.sincronizar_elemento(self.ELEMENTO))
+        resultado = arbol(self.destino())
+        shutil.rmtree(self.destino())
+        return resultado
+
+    def test_misma_disposicion_con_y_sin_files_from(self):
+        esperado = arbol(self.local / self.ELEMENTO) | {'existente.txt'}
+        # Sin --delete se pasa la lista precalculada (--files-from)
+        self.assertEqual(self.sincronizar(), esperado)
+        # Con --delete rsync recorre el árbol (--recursive)
+        self.assertEqual(self.sincronizar('--delete'), esperado - {'existente.txt'})
+
+
+@unittest.skipIf(shutil.which('tar') is None, "tar no está instalado")
+class TestDisposicionTar(SyncBTestCase):
+    """La copia inicial con tar deja el contenido donde lo dejaría rsync"""
+
+    def test_copia_inicial_en_destino_del_elemento(self):
+        sb = self.crear_syncb('--subir', '--yes')
+        with mock.patch.object(syncb, 'initial_sync_tar', wraps=syncb.initial_sync_tar) as tar:
+            self.assertTrue(sb.sincronizar_elemento(self.ELEMENTO))
+        tar.assert_called_once()
+        self.assertEqual(arbol(self.destino()), arbol(self.local / self.ELEMENTO))
+
+    @unittest.skipIf(shutil.which('rsync') is None, "rsync no está instalado")
+    def test_segunda_ejecucion_con_rsync_misma_disposicion(self):
+        sb = self.crear_syncb('--subir', '--yes')
+        self.assertTrue(sb.sincronizar_elemento(self.ELEMENTO))
+        primera = arbol(self.destino())
+        # El destino ya no está vacío: ahora sincroniza rsync
+        (self.local / self.ELEMENTO / 'sub' / 'nuevo.txt').write_text('n')
+        self.assertTrue(sb.sincronizar_elemento(self.ELEMENTO))
+        self.assertEqual(arbol(self.destino()), primera | {'sub/nuevo.txt'})
+
+
+
+class TestPermisos(SyncBTestCase):
+    """aplicar_permisos: orden de la configuración y directorios inaccesibles"""
+
+    CONFIG_EXTRA = (
+        '[permisos.archivos]\n'
+        '"Documentos/a.txt" = "600"\n'
+        '"*.txt" = "640"\n'
+        '"Documentos/sub/b.txt" = "604"\n'
+        '[permisos.directorios]\n'
+        '"priv*" = "750"\n'
+    )
+
+    def modo(self, *partes: str) -> int:
+        return os.stat(self.local.joinpath(*partes)).st_mode & 0o7777
+
+    def test_gana_la_ultima_regla(self):
+        (self.local / self.ELEMENTO / 'a.txt').chmod(0o644)
+        (self.local / self.ELEMENTO / 'sub' / 'b.txt').chmod(0o644)
+        self.crear_syncb('--subir').aplicar_permisos()
+        # Patrón detrás de la ruta concreta: gana el patrón
+        self.assertEqual(self.modo(self.ELEMENTO, 'a.txt'), 0o640)
+        # Ruta concreta detrás del patrón: gana la ruta concreta
+        self.assertEqual(self.modo(self.ELEMENTO, 'sub', 'b.txt'), 0o604)
+        self.assertEqual(self.modo(self.ELEMENTO, 'sub', 'profundo', 'c.txt'), 0o640)
+
+    @unittest.skipIf(os.geteuid() == 0, "root puede abrir directorios con modo 000")
+    def test_directorio_sin_permisos_se_corrige_y_recorre(self):
+        privado = self.local / 'privado'
+        privado.mkdir()
+        (privado / 'd.txt').write_text('d')
+        privado.chmod(0o000)
+        self.addCleanup(privado.chmod, 0o700)
+        self.crear_syncb('--subir').aplicar_permisos()
+        self.assertEqual(self.modo('privado'), 0o750)
+        self.assertEqual(self.modo('privado', 'd.txt'), 0o640)
+
+
+if __name__ == '__main__':
+    unittest.main()